@@ -1,22 +1,35 @@
-from psychopy import prefs
-prefs.hardware['audioLib'] = ['PTB']
+import os
+HEADLESS = os.environ.get('JUDIT_HEADLESS') == '1'  # Run against a simulated observer (see headless.py)
 
-import psutil
-p = psutil.Process()
-p.nice(psutil.HIGH_PRIORITY_CLASS)
+if HEADLESS:
+    from headless import visual, core, event, sound, gui, data, monitors
+else:
+    from psychopy import prefs
+    prefs.hardware['audioLib'] = ['PTB']
 
-from psychopy import visual, core, event, sound, gui, data, monitors
-import os
+    import psutil
+    p = psutil.Process()
+    p.nice(psutil.HIGH_PRIORITY_CLASS)
+
+    from psychopy import visual, core, event, sound, gui, data, monitors
+import datetime
 import numpy as np
-import pandas as pd
 import random
-import csv
+from tone_engine import render_tone, assemble_sequence
+from stimulus_bank import load_bank
+from trial_lists import load_trial_plan
+from results import ResultWriter, close_all
+from event_log import EventLog
+from manifest import verify_trial_list, candidate_trial_lists
+from stimulus_pool import SoundPool, ScreenCache
+from audio_format import format_from_env
 
 # Constants
 BASE_FREQ = 523.25  # Hz
 DURATION = 0.08  # seconds
 INTENSITY_NORMAL = 0.5  # normalized intensity
-SAMPLE_RATE = 96000  # Hz
+AUDIO_FORMAT = format_from_env()  # sample rate and storage type, see audio_format.py
+SAMPLE_RATE = AUDIO_FORMAT.sample_rate  # Hz
 FIXATION_TIME = 1  # seconds for fixation cross
 SEQ_LEN = 14
 PRACTICE_TRIALS = 8  # number of practice trials
@@ -47,7 +60,11 @@ skip_practice = bool(dialogue.data[2])
 # Initialize PsychoPy window and stimuli
 win = visual.Window(monitor=mon, fullscr=True, color=(-0.1, -0.1, -0.1))
 fixation = visual.TextStim(win, text='+', height=0.1, color=(1, 1, 1))
-message = visual.TextStim(win, pos=(0, -0.3), height=0.05)
+response_prompt = """Was there a louder tone?\n\nYes (y)     /     No (n)"""
+# Text screens are laid out once and Sounds refilled in place rather than rebuilt every trial
+screens = ScreenCache(win, visual.TextStim, pos=(0, 0))
+screens.get('response', response_prompt, height=0.1)
+sound_pool = SoundPool(sound.Sound, SAMPLE_RATE)
 mouse = event.Mouse(win=win)
 mouse.setVisible(False)
 
@@ -59,41 +76,24 @@ instructions_text = """Welcome to the experiment.
 In this task, you will hear a series of tones. You need to decide if any of the tones differed in intensity from the others.
 Press 'y' for Yes if you think there was a different tone, and 'n' for No if you think all tones were the same.
 Press the space bar to continue."""
-instructions = visual.TextStim(win, text=instructions_text, pos=(0, 0), wrapWidth=1.5)
 
 # Show instructions
 def show_instructions():
-    instructions.draw()
-    win.flip()
+    screens.show('instructions', instructions_text, wrapWidth=1.5)
     event.waitKeys(keyList=['space'])
 
 # Data file setup
-data_dir = 'data/'
+data_dir = os.environ.get('JUDIT_DATA_DIR', 'data/')
 os.makedirs(data_dir, exist_ok=True)
 
 # Generate tone
 def generate_tone(frequency, duration, sample_rate, amplitude):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    tone = amplitude * np.sin(2 * np.pi * frequency * t)
-    
-    # Apply envelope
-    attack_duration = int(sample_rate * 0.02)
-    release_duration = int(sample_rate * 0.02)
-    envelope = np.ones_like(tone)
-    envelope[:attack_duration] = np.linspace(0, 1, attack_duration)
-    envelope[-release_duration:] = np.linspace(1, 0, release_duration)
-    
-    tone = tone * envelope
-    
-    return tone
+    # The unit tone is rendered once per (frequency, duration, sample_rate) and scaled here
+    return render_tone(frequency, duration, sample_rate, amplitude, dtype=np.float32)
 
 # Combine tones into one continuous sound
 def combine_tones(sequence, sample_rate):
-    combined_tone = np.array([], dtype=np.float32)
-    for tone, interval in sequence:
-        silence = np.zeros(int(sample_rate * interval), dtype=np.float32)
-        combined_tone = np.concatenate((combined_tone, tone, silence))
-    return combined_tone
+    return assemble_sequence(sequence, sample_rate, dtype=np.float32)
 
 # Load pre-generated trial structure
 def load_trial_structure(condition):
@@ -101,34 +101,51 @@ def load_trial_structure(condition):
     Load the pre-generated trial structure for a given condition.
     """
     trial_list_path = "trialList/"
-    structure_files = [f for f in os.listdir(trial_list_path) if f.startswith(f"JUDIT_{condition}")]
+    structure_files = candidate_trial_lists(trial_list_path, rf"JUDIT_{condition}_\d+\.csv", 'JUDIT_gen_trials.py')
     chosen_filename = random.choice(structure_files)
-    trial_data = pd.read_csv(trial_list_path + chosen_filename)
+    # Refuse trial lists whose generation parameters or files no longer match the manifest
+    verify_trial_list(trial_list_path + chosen_filename, {'BASE_FREQ': BASE_FREQ, 'DURATION': DURATION, 'SAMPLE_RATE': SAMPLE_RATE,
+                                                          'SEQ_LEN': SEQ_LEN, 'INTENSITY_NORMAL': INTENSITY_NORMAL})
+    trial_data = load_trial_plan(trial_list_path + chosen_filename, int(SAMPLE_RATE * DURATION), SAMPLE_RATE, SEQ_LEN)
     structure_number = chosen_filename.split('_')[-1].split('.')[0]
-    print(type(trial_data))
-    print(trial_data)
+    print(f"Loaded {len(trial_data)} trials from {chosen_filename}")
 
-    return trial_data, structure_number
+    # Memory-map the pre-rendered audio if the generator saved a stimulus bank
+    bank = load_bank(trial_list_path + chosen_filename, sample_rate=SAMPLE_RATE)
+    if bank is not None and not np.isclose(bank.amplitude, INTENSITY_NORMAL):
+        raise ValueError(f"Stimulus bank for {chosen_filename} was rendered at amplitude {bank.amplitude}, expected {INTENSITY_NORMAL}")
 
-# Run trial
-def run_trial(trial_data, practice=False):
-    trial_num = int(trial_data['trial_num'])
-    periodic = trial_data['periodic']
-    has_high_intensity = trial_data['has_high_intensity']
-    chosen_IOI = float(trial_data['chosen_IOI']) if trial_data['chosen_IOI'] else None
-   # Instead of directly casting to int, check if it is NaN
-    high_intensity_index = int(trial_data['high_intensity_index']) if not pd.isna(trial_data['high_intensity_index']) else None
-    percentage_increase = float(trial_data['percentage_increase']) if trial_data['percentage_increase'] else None
-    intervals = eval(trial_data['intervals'])
+    return trial_data, structure_number, bank
 
+# Synthesize the tone sequence for a trial
+def render_sequence(intervals, high_intensity_index, percentage_increase):
     sequence = []
+    normal_tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL)
     for i in range(SEQ_LEN):
         interval = intervals[i]
-        amplitude = percentage_increase if i == high_intensity_index else INTENSITY_NORMAL
-        tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, amplitude)
+        if i == high_intensity_index:
+            tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, percentage_increase)
+        else:
+            tone = normal_tone
         sequence.append((tone, interval))
 
-    combined_tone = combine_tones(sequence, SAMPLE_RATE)
+    return combine_tones(sequence, SAMPLE_RATE)
+
+# Run trial
+def run_trial(trial, practice=False, bank=None):
+    trial_num = trial.trial_num
+    periodic = trial.periodic
+    has_high_intensity = trial.has_high_intensity
+    chosen_IOI = trial.chosen_IOI
+    high_intensity_index = trial.high_intensity_index
+    percentage_increase = trial.percentage_increase
+    intervals = trial.intervals
+
+    if bank is not None:
+        # Exact samples rendered by the generator; zero-copy unless the bank is stored as int16
+        combined_tone = bank.format.decode(bank[trial_num])
+    else:
+        combined_tone = render_sequence(intervals, high_intensity_index, percentage_increase)
     
     # Display fixation cross
     fixation.draw()
@@ -136,22 +153,19 @@ def run_trial(trial_data, practice=False):
     core.wait(FIXATION_TIME)
 
     # Play combined tone and record duration
-    tone_obj = sound.Sound(combined_tone, sampleRate=SAMPLE_RATE)
+    tone_obj = sound_pool.acquire(combined_tone)
     tone_obj.play()
     core.wait(tone_obj.getDuration())
     tone_obj.stop()  # Ensure the tone is stopped
     
     # Collect response
     response_clock = core.Clock()
-    message.setText("""Was there a louder tone?\n\nYes (y)     /     No (n)""")
-    message.setPos((0, 0))
-    message.setHeight(0.1)
-    message.draw()
-    win.flip()
+    screens.show('response', response_prompt)
     
     response_clock.reset()
     keys = event.waitKeys(keyList=['y', 'n', 'escape'], timeStamped=response_clock)
     if 'escape' in [key[0] for key in keys]:
+        close_all()  # Write out any queued results before quitting
         win.close()
         core.quit()
 
@@ -163,9 +177,9 @@ def run_trial(trial_data, practice=False):
     hasManip = 1 if has_high_intensity else 0
 
     if not practice:
-        with open(filename, 'a', newline='') as file:
-            writer = csv.writer(file)
-            writer.writerow([participant_number, condition, periodic, chosen_IOI, hasManip, trial_num, high_intensity_index, user_response, correct_answer, correct, response_time, percentage_increase])
+        results_writer.write([participant_number, condition, periodic, chosen_IOI, hasManip, trial_num, high_intensity_index, user_response, correct_answer, correct, response_time, percentage_increase])
+        event_log.trial(trial_num, periodic, chosen_IOI, hasManip, high_intensity_index, percentage_increase,
+                        user_response == 'yes', correct, response_time)
 
     return user_response, correct_answer, correct, response_time
 
@@ -175,26 +189,22 @@ def run_practice():
     practice_file_path = "trialList/prac_file.csv"
     
     # Load practice trials
-    practice_trials = pd.read_csv(practice_file_path)
+    practice_trials = load_trial_plan(practice_file_path, int(SAMPLE_RATE * DURATION), SAMPLE_RATE, SEQ_LEN)
     
     practice_instructions_text = """This is a practice phase.
     You will hear a series of tones and need to decide if any of them differed in intensity.
     Press 'y' for Yes and 'n' for No.
     Press the space bar to begin."""
-    practice_instructions = visual.TextStim(win, text=practice_instructions_text, pos=(0, 0), wrapWidth=1.5)
-    practice_instructions.draw()
-    win.flip()
+    screens.show('practice_instructions', practice_instructions_text, wrapWidth=1.5)
     event.waitKeys(keyList=['space'])
 
     # Run each practice trial
-    for index, trial in practice_trials.iterrows():
+    for trial in practice_trials:
         run_trial(trial, practice=True)
 
     end_practice_text = """Practice phase complete.
     Press the space bar to begin the main experiment."""
-    end_practice = visual.TextStim(win, text=end_practice_text, pos=(0, 0), wrapWidth=1.5)
-    end_practice.draw()
-    win.flip()
+    screens.show('end_practice', end_practice_text, wrapWidth=1.5)
     event.waitKeys(keyList=['space'])
 
 # Main function
@@ -202,25 +212,29 @@ def main():
     show_instructions()
     
     # Load main trials, not including practice trials
-    trial_data, structure_number = load_trial_structure(condition)
+    trial_data, structure_number, bank = load_trial_structure(condition)
     
-    global filename
-    filename = f"{data_dir}JUDIT_{participant_number}_{condition}_{structure_number}.csv"
+    global results_writer, event_log
+    filename = os.path.join(data_dir, f"JUDIT_{participant_number}_{condition}_{structure_number}.csv")
     
     # Write header for the trial results file
-    with open(filename, 'w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['participant_number', 'condition', 'periodic', 'chosen_IOI', 'has_high_intensity', 'trial_num', 'high_intensity_index', 'user_response', 'correct_answer', 'correct', 'response_time', 'percentage_increase'])
+    results_writer = ResultWriter(filename, header=['participant_number', 'condition', 'periodic', 'chosen_IOI', 'has_high_intensity', 'trial_num', 'high_intensity_index', 'user_response', 'correct_answer', 'correct', 'response_time', 'percentage_increase'])
+
+    # Binary per-trial log shared with JUDIT_task_modified.py sessions
+    event_log = EventLog(data_dir, participant_number, structure_number, condition,
+                         datetime.datetime.now().strftime('%d-%m-%Y'), task='JUDIT_task', level_unit='amplitude')
 
     # Run practice if not skipped
     if not skip_practice:
         run_practice()
     
     try:
-        # Iterate through each row in the DataFrame, ensuring it's treated as a single trial
-        for index, trial in trial_data.iterrows():
-            run_trial(trial)
+        # Iterate through the compiled trial plan
+        for trial in trial_data:
+            run_trial(trial, bank=bank)
     finally:
+        close_all()
+        event_log.close()
         mouse.setVisible(True)
         win.close()
 
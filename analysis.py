@@ -0,0 +1,226 @@
+import argparse
+import csv
+import glob
+import json
+import os
+from statistics import NormalDist
+import numpy as np
+from generation import run_tasks
+from manifest import file_checksum
+from trial_lists import NO_TARGET, save_npz
+
+# Constants
+CACHE_NAME = "analysis_cache.json"  # per-file results, kept in the data directory
+MAIN_PATTERN = "JUDIT_*.csv"
+ADAPTIVE_PATTERN = "adaptive_tracking_*.csv"
+SUMMARY_COLUMNS = ['participant', 'condition', 'periodic', 'high_intensity_index', 'sessions', 'n_trials', 'n_yes',
+                   'accuracy', 'yes_rate', 'false_alarm_rate', 'd_prime', 'rt_mean', 'rt_median']
+ADAPTIVE_COLUMNS = ['participant', 'date', 'session', 'n_trials', 'accuracy', 'final_level_db', 'mean_last_level_db']
+ADAPTIVE_LAST_TRIALS = 12  # trials averaged for mean_last_level_db
+
+# Parse a CSV value that may be empty, 'None' or a float-formatted integer
+def _optional_int(value, missing=NO_TARGET):
+    return int(float(value)) if value not in ('', 'None', 'nan') else missing
+
+# Summarize one main-task session file into per (periodic, high_intensity_index) cells
+def summarize_main_session(path):
+    """
+    Handles both result layouts: JUDIT_task_modified.py (JUDIT_{participant}_{structure}_{date}.csv)
+    and JUDIT_task.py (JUDIT_{participant}_{condition}_{structure}.csv, with a condition
+    column). Trials without a louder tone get high_intensity_index NO_TARGET. Response
+    times are kept per cell so medians can be taken across sessions.
+    """
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    name_parts = os.path.splitext(os.path.basename(path))[0].split('_')
+    has_condition = bool(rows) and 'condition' in rows[0]
+    meta = {
+        'participant': rows[0]['participant_number'] if rows else '_'.join(name_parts[1:-2]),
+        'condition': int(rows[0]['condition']) if has_condition else 0,
+        'structure': name_parts[-1] if has_condition else name_parts[-2],
+        'date': '' if has_condition else name_parts[-1],
+    }
+    periodic = np.array([int(row['periodic'] in ('1', 'True')) for row in rows], dtype=np.int8)
+    index = np.array([_optional_int(row['high_intensity_index']) for row in rows], dtype=np.int16)
+    said_yes = np.array([row['user_response'] == 'yes' for row in rows], dtype=bool)
+    correct = np.array([int(row['correct']) for row in rows], dtype=np.int8)
+    rt = np.array([float(row['response_time']) for row in rows], dtype=np.float64)
+
+    cells = []
+    for cell_periodic, cell_index in sorted(set(zip(periodic.tolist(), index.tolist()))):
+        mask = (periodic == cell_periodic) & (index == cell_index)
+        cells.append({'periodic': cell_periodic, 'high_intensity_index': cell_index, 'n_trials': int(mask.sum()),
+                      'n_yes': int(said_yes[mask].sum()), 'n_correct': int(correct[mask].sum()),
+                      'rts': rt[mask].tolist()})
+    return {'kind': 'main', **meta, 'cells': cells}
+
+# Summarize one adaptive tracking file
+def summarize_adaptive_session(path):
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    name_parts = os.path.splitext(os.path.basename(path))[0].split('_')
+    return {'kind': 'adaptive', 'participant': '_'.join(name_parts[2:-1]), 'date': name_parts[-1],
+            'levels': [float(row['intensity_change_db']) for row in rows],
+            'correct': [int(row['correct']) for row in rows]}
+
+# Summarize any session file by its name
+def summarize_session(path):
+    if os.path.basename(path).startswith('adaptive_tracking_'):
+        return summarize_adaptive_session(path)
+    return summarize_main_session(path)
+
+# Session files in a data directory
+def discover_sessions(data_dir):
+    return sorted(glob.glob(os.path.join(data_dir, MAIN_PATTERN)) + glob.glob(os.path.join(data_dir, ADAPTIVE_PATTERN)))
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_cache(cache, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(cache, file)
+    os.replace(tmp_path, path)
+
+# Summaries for every session file, parsing only files that are new or changed
+def collect_sessions(paths, cache, workers=1):
+    """
+    A cached summary is reused when the file's size and mtime are unchanged, or when
+    they changed but its SHA-256 did not (e.g. after copying the data directory).
+    Returns the summaries in path order and the number of files that were parsed.
+    """
+    todo = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = cache.get(os.path.basename(path))
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            continue
+        checksum = file_checksum(path)
+        if entry is not None and entry['sha256'] == checksum:
+            entry['mtime'] = stat.st_mtime
+            continue
+        todo.append((path, stat, checksum))
+
+    summaries = run_tasks(summarize_session, [(path,) for path, _, _ in todo], workers)
+    for (path, stat, checksum), summary in zip(todo, summaries):
+        cache[os.path.basename(path)] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': checksum, 'summary': summary}
+    return [cache[os.path.basename(path)]['summary'] for path in paths], len(todo)
+
+# Inverse standard normal CDF of an array of rates
+def probit(rates):
+    # Rates come from small integer counts, so only the distinct values go through NormalDist
+    values, inverse = np.unique(np.asarray(rates, dtype=np.float64), return_inverse=True)
+    z = np.array([NormalDist().inv_cdf(value) for value in values])
+    return z[inverse].reshape(np.shape(rates))
+
+# Hit and false-alarm rates with the log-linear correction, so rates of 0 or 1 stay finite
+def corrected_rates(hits, targets, false_alarms, non_targets):
+    hit_rate = (np.asarray(hits) + 0.5) / (np.asarray(targets) + 1)
+    false_alarm_rate = (np.asarray(false_alarms) + 0.5) / (np.asarray(non_targets) + 1)
+    return hit_rate, false_alarm_rate
+
+# d' from yes counts; works elementwise on arrays
+def d_prime(hits, targets, false_alarms, non_targets):
+    hit_rate, false_alarm_rate = corrected_rates(hits, targets, false_alarms, non_targets)
+    return probit(hit_rate) - probit(false_alarm_rate)
+
+# Aggregate main-task cells per participant x condition x periodic x high_intensity_index
+def aggregate_main(summaries):
+    """
+    Returns a dict of columns (see SUMMARY_COLUMNS). d' of a target cell uses the
+    false alarms of the same participant, condition and periodicity; rows for trials
+    without a louder tone (high_intensity_index NO_TARGET) have d' NaN.
+    """
+    cells = {}
+    for summary in summaries:
+        if summary['kind'] != 'main':
+            continue
+        for cell in summary['cells']:
+            key = (summary['participant'], summary['condition'], cell['periodic'], cell['high_intensity_index'])
+            total = cells.setdefault(key, {'sessions': 0, 'n_trials': 0, 'n_yes': 0, 'n_correct': 0, 'rts': []})
+            total['sessions'] += 1
+            for name in ('n_trials', 'n_yes', 'n_correct'):
+                total[name] += cell[name]
+            total['rts'].extend(cell['rts'])
+
+    keys = sorted(cells)
+    columns = {name: [] for name in SUMMARY_COLUMNS}
+    for key in keys:
+        participant, condition, periodic, index = key
+        cell = cells[key]
+        noise = cells.get((participant, condition, periodic, NO_TARGET))
+        rts = np.array(cell['rts'])
+        values = {
+            'participant': participant, 'condition': condition, 'periodic': periodic, 'high_intensity_index': index,
+            'sessions': cell['sessions'], 'n_trials': cell['n_trials'], 'n_yes': cell['n_yes'],
+            'accuracy': cell['n_correct'] / cell['n_trials'], 'yes_rate': cell['n_yes'] / cell['n_trials'],
+            'false_alarm_rate': noise['n_yes'] / noise['n_trials'] if noise else np.nan,
+            'd_prime': np.nan, 'rt_mean': rts.mean() if len(rts) else np.nan,
+            'rt_median': np.median(rts) if len(rts) else np.nan,
+        }
+        if index != NO_TARGET and noise:
+            values['d_prime'] = float(d_prime(cell['n_yes'], cell['n_trials'], noise['n_yes'], noise['n_trials']))
+        for name in SUMMARY_COLUMNS:
+            columns[name].append(values[name])
+    return {name: np.array(values) for name, values in columns.items()}
+
+# One row per adaptive tracking session
+def aggregate_adaptive(summaries, paths):
+    columns = {name: [] for name in ADAPTIVE_COLUMNS}
+    for summary, path in zip(summaries, paths):
+        if summary['kind'] != 'adaptive' or not summary['levels']:
+            continue
+        levels = np.array(summary['levels'])
+        values = {'participant': summary['participant'], 'date': summary['date'], 'session': os.path.basename(path),
+                  'n_trials': len(levels), 'accuracy': float(np.mean(summary['correct'])), 'final_level_db': levels[-1],
+                  'mean_last_level_db': levels[-ADAPTIVE_LAST_TRIALS:].mean()}
+        for name in ADAPTIVE_COLUMNS:
+            columns[name].append(values[name])
+    return {name: np.array(values) for name, values in columns.items()}
+
+# Create the directory an output stem points into, so a bad --out fails before any parsing
+def prepare_output(stem):
+    directory = os.path.dirname(stem)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+# Write columns as an .npz dataset and a CSV with the same columns
+def write_dataset(columns, stem, names):
+    save_npz(f"{stem}.npz", **columns)
+    with open(f"{stem}.csv", 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(names)
+        writer.writerows(zip(*(columns[name].tolist() for name in names)))
+
+# Session paths and summaries for a data directory, updating its cache
+def load_summaries(data_dir, workers=1):
+    cache_path = os.path.join(data_dir, CACHE_NAME)
+    cache = load_cache(cache_path)
+    paths = discover_sessions(data_dir)
+    summaries, parsed = collect_sessions(paths, cache, workers)
+    save_cache(cache, cache_path)
+    return paths, summaries, parsed
+
+# Analyze every session in a data directory, reusing cached per-file results
+def run_analysis(data_dir, out_stem, workers=1):
+    prepare_output(out_stem)
+    paths, summaries, parsed = load_summaries(data_dir, workers)
+    main = aggregate_main(summaries)
+    adaptive = aggregate_adaptive(summaries, paths)
+    write_dataset(main, out_stem, SUMMARY_COLUMNS)
+    write_dataset(adaptive, f"{out_stem}_adaptive", ADAPTIVE_COLUMNS)
+    return main, adaptive, len(paths), parsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize every JUDIT session in a data directory.")
+    parser.add_argument('data_dir', nargs='?', default='data/', help="directory with the session CSV files")
+    parser.add_argument('--out', default='judit_summary', help="output stem; writes <stem>.npz/.csv and <stem>_adaptive.npz/.csv")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes")
+    args = parser.parse_args()
+    main, adaptive, total, parsed = run_analysis(args.data_dir, args.out, args.workers)
+    participants = len(set(main['participant'].tolist()) | set(adaptive['participant'].tolist()))
+    print(f"{total} session files ({parsed} parsed, {total - parsed} cached), {participants} participants")
+    print(f"Wrote {args.out}.csv ({len(main['participant'])} rows) and {args.out}_adaptive.csv ({len(adaptive['participant'])} rows)")
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+
+# Defaults; each rig can override them with JUDIT_SAMPLE_RATE, JUDIT_AUDIO_DTYPE and JUDIT_HEADROOM_DB
+DEFAULT_SAMPLE_RATE = 96000  # Hz
+DEFAULT_DTYPE = 'float32'
+DEFAULT_HEADROOM_DB = 1.0  # dB above amplitude 1.0 that int16 audio can hold without clipping
+DTYPES = ('float32', 'int16')
+INT16_FULL_SCALE = 32767
+
+# Sample rate and storage type of rendered audio
+class AudioFormat:
+    """
+    float32 audio is stored as is. int16 audio is scaled so that amplitude
+    10 ** (headroom_db / 20) maps to full scale; decode() undoes the scaling, so
+    levels are the same in both formats and only the quantization step differs.
+    """
+
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, dtype=DEFAULT_DTYPE, headroom_db=DEFAULT_HEADROOM_DB):
+        if dtype not in DTYPES:
+            raise ValueError(f"Audio dtype must be one of {DTYPES}, got {dtype!r}")
+        self.sample_rate = int(sample_rate)
+        self.dtype = dtype
+        self.headroom_db = float(headroom_db)
+        self.peak_limit = 10 ** (self.headroom_db / 20)
+
+    def __repr__(self):
+        return f"AudioFormat(sample_rate={self.sample_rate}, dtype={self.dtype!r}, headroom_db={self.headroom_db})"
+
+    # Parameters recorded in the generation manifest
+    def params(self):
+        return {'dtype': self.dtype, 'headroom_db': self.headroom_db}
+
+    # Convert float audio to the storage type
+    def encode(self, samples):
+        if self.dtype == 'float32':
+            return np.asarray(samples, dtype=np.float32)
+        samples = np.asarray(samples)
+        peak = float(np.abs(samples).max()) if samples.size else 0.0
+        if peak > self.peak_limit:
+            raise ValueError(f"Peak amplitude {peak:.3f} exceeds the int16 headroom of {self.headroom_db} dB")
+        return np.rint(samples * (INT16_FULL_SCALE / self.peak_limit)).astype(np.int16)
+
+    # Convert stored audio back to float32 for playback; float32 audio is returned without a copy
+    def decode(self, samples):
+        if samples.dtype == np.int16:
+            return samples.astype(np.float32) * np.float32(self.peak_limit / INT16_FULL_SCALE)
+        return np.asarray(samples, dtype=np.float32)
+
+    # Largest absolute error and signal-to-error ratio (dB) of storing `samples` in this format
+    def quantization_error(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        error = self.decode(self.encode(samples)).astype(np.float64) - samples
+        noise = float(np.sum(error ** 2))
+        snr_db = np.inf if noise == 0 else 10 * np.log10(float(np.sum(samples ** 2)) / noise)
+        return float(np.abs(error).max()), snr_db
+
+    # One-line description including the quantization error on a reference signal
+    def describe(self, reference):
+        max_error, snr_db = self.quantization_error(reference)
+        return f"{self.dtype} at {self.sample_rate} Hz, quantization error max {max_error:.2e} (SNR {snr_db:.1f} dB)"
+
+# Audio format for this process, taken from the environment so worker processes agree
+def format_from_env():
+    return AudioFormat(int(os.environ.get('JUDIT_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)),
+                       os.environ.get('JUDIT_AUDIO_DTYPE', DEFAULT_DTYPE),
+                       float(os.environ.get('JUDIT_HEADROOM_DB', DEFAULT_HEADROOM_DB)))
@@ -0,0 +1,278 @@
+import threading
+import time
+import wave
+import numpy as np
+
+# Constants
+BLOCK_SIZE = 256  # samples the output device asks for per callback
+RING_BLOCKS = 8  # blocks of mixed audio held ahead of the device
+LEAD_TIME = 0.05  # seconds between scheduling a sequence and its first onset
+
+# Fixed-size single-producer/single-consumer sample FIFO
+class RingBuffer:
+    def __init__(self, capacity, dtype=np.float32):
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        self.read_pos = 0  # total samples read so far
+        self.write_pos = 0  # total samples written so far
+
+    def __len__(self):
+        return self.write_pos - self.read_pos
+
+    def space(self):
+        return len(self.buffer) - len(self)
+
+    # Slices of the ring covering `count` samples starting at total position `pos`
+    def _spans(self, pos, count):
+        start = pos % len(self.buffer)
+        first = min(count, len(self.buffer) - start)
+        return (start, first), (0, count - first)
+
+    # Reserve the next `count` samples for writing and return them as up to two zeroed views
+    def reserve(self, count):
+        if count > self.space():
+            raise ValueError(f"Ring buffer has room for {self.space()} samples, not {count}")
+        views = []
+        for start, length in self._spans(self.write_pos, count):
+            if length:
+                view = self.buffer[start:start + length]
+                view[:] = 0
+                views.append(view)
+        return views
+
+    def commit(self, count):
+        self.write_pos += count
+
+    # Copy up to len(out) samples into out; returns how many were available
+    def read(self, out):
+        count = min(len(out), len(self))
+        done = 0
+        for start, length in self._spans(self.read_pos, count):
+            out[done:done + length] = self.buffer[start:start + length]
+            done += length
+        self.read_pos += count
+        return count
+
+# One scheduled sequence; onset_times are filled in as the device plays each tone
+class StreamHandle:
+    def __init__(self, onsets, end_sample, sample_rate):
+        self.onsets = onsets
+        self.sample_rate = sample_rate
+        self.end_sample = int(end_sample)  # the sequence includes the silence after its last tone
+        self.duration = (self.end_sample - onsets[0]) / sample_rate
+        self.onset_times = [None] * len(onsets)
+        self._done = threading.Event()
+
+    # Largest deviation of the played inter-onset times from the scheduled ones, in seconds
+    def onset_error(self):
+        if None in self.onset_times:
+            return None
+        played = np.diff(self.onset_times)
+        scheduled = np.diff(self.onsets) / self.sample_rate
+        return float(np.abs(played - scheduled).max()) if len(played) else 0.0
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    # Called by the output device once the block holding the last sample has been played
+    def finish(self):
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+# Mixes scheduled tones into a ring buffer on demand for a callback-driven output device
+class ToneStream:
+    """
+    play_sequence() only queues (onset sample, tone) events, so memory stays constant
+    however long the sequence is. The device callback pulls `len(out)` samples at a
+    time; whenever the ring runs low, the next blocks are mixed from the events that
+    overlap them. Onsets are sample-accurate in stream time, and the device time of
+    every tone's first sample is recorded on its handle when that sample is played.
+    """
+
+    def __init__(self, device, sample_rate, block_size=BLOCK_SIZE, ring_blocks=RING_BLOCKS, lead_time=LEAD_TIME,
+                 dtype=np.float32):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.lead_samples = int(round(lead_time * sample_rate))
+        self.ring = RingBuffer(block_size * ring_blocks, dtype)
+        self.handles = []
+        self._events = []  # [start sample, tone, handle, tone index], ordered by start
+        self._pending_onsets = []  # (sample, handle, tone index) mixed but not yet played
+        self._lock = threading.Lock()
+        device.start(self._callback, sample_rate, block_size, self.busy)
+
+    # Schedule tones at sample offsets relative to the sequence start
+    def play_sequence(self, tones, onsets, length):
+        """
+        `length` is the total length of the sequence in samples, including the silence
+        after the last tone (as returned by tone_engine.sequence_onsets), so the handle
+        lasts exactly as long as the same sequence played from one buffer.
+        """
+        with self._lock:
+            # Never schedule into audio that has already been mixed
+            start = self.ring.write_pos + self.lead_samples
+            onsets = [start + int(onset) for onset in onsets]
+            end = max([start + int(length)] + [onset + len(tone) for onset, tone in zip(onsets, tones)])
+            handle = StreamHandle(onsets, end, self.sample_rate)
+            for i, (onset, tone) in enumerate(zip(onsets, tones)):
+                self._events.append([onset, tone, handle, i])
+            self._events.sort(key=lambda event: event[0])
+            self.handles.append(handle)
+        return handle
+
+    # Whether any scheduled audio is still waiting to be played
+    def busy(self):
+        with self._lock:
+            return bool(self._events or self._pending_onsets or self.handles)
+
+    def close(self):
+        self.device.stop()
+
+    # Mix the next `count` samples of all overlapping events into the ring
+    def _mix(self, count):
+        block_start = self.ring.write_pos
+        block_end = block_start + count
+        views = self.ring.reserve(count)
+        remaining = []
+        for event in self._events:
+            onset, tone, handle, i = event
+            if onset >= block_end:
+                remaining.append(event)
+                continue
+            if onset >= block_start:
+                self._pending_onsets.append((onset, handle, i))
+            first = max(onset, block_start)
+            last = min(onset + len(tone), block_end)
+            pos = block_start
+            for view in views:
+                lo, hi = max(first, pos), min(last, pos + len(view))
+                if lo < hi:
+                    view[lo - pos:hi - pos] += tone[lo - onset:hi - onset]
+                pos += len(view)
+            if onset + len(tone) > block_end:
+                remaining.append(event)
+        self._events = remaining
+        self.ring.commit(count)
+
+    # Output device callback: fill `out` and record when scheduled tones reach the output
+    def _callback(self, out, dac_time):
+        """
+        Returns the handles whose last sample is in `out`. The device calls finish() on
+        them only once the block has been played, so wait() never returns while the
+        end of a sequence is still on its way.
+        """
+        with self._lock:
+            while len(self.ring) < len(out):
+                self._mix(min(self.block_size, self.ring.space()))
+            read_start = self.ring.read_pos
+            self.ring.read(out)
+            read_end = self.ring.read_pos
+
+            pending = []
+            for sample, handle, i in self._pending_onsets:
+                if sample < read_end:
+                    handle.onset_times[i] = dac_time + (sample - read_start) / self.sample_rate
+                else:
+                    pending.append((sample, handle, i))
+            self._pending_onsets = pending
+            finished = [handle for handle in self.handles if handle.end_sample <= read_end]
+            self.handles = [handle for handle in self.handles if handle.end_sample > read_end]
+            return finished
+
+# Fake output device that writes the stream to a 16-bit WAV file instead of a sound card
+class FileOutputDevice:
+    """
+    With `realtime` the callback runs once per block at the device's sample rate and
+    silence between sequences is written too. Without it, blocks are pulled as fast as
+    possible and only while the stream has audio scheduled, so tests finish quickly;
+    device time is then the number of samples written divided by the sample rate.
+    `listener`, when given, is called with every block that was written.
+    """
+
+    def __init__(self, filename, realtime=False, listener=None):
+        self.filename = filename
+        self.realtime = realtime
+        self.listener = listener
+        self.frames_written = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, callback, sample_rate, block_size, active):
+        self._file = wave.open(self.filename, 'wb')
+        self._file.setnchannels(1)
+        self._file.setsampwidth(2)
+        self._file.setframerate(sample_rate)
+        self._thread = threading.Thread(target=self._run, args=(callback, sample_rate, block_size, active), daemon=True)
+        self._thread.start()
+
+    def _run(self, callback, sample_rate, block_size, active):
+        block = np.zeros(block_size, dtype=np.float32)
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            if self.realtime:
+                dac_time = start + self.frames_written / sample_rate
+                delay = dac_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif not active():
+                time.sleep(0.0005)
+                continue
+            else:
+                dac_time = self.frames_written / sample_rate
+            finished = callback(block, dac_time)
+            self._file.writeframes((np.clip(block, -1, 1) * 32767).astype('<i2').tobytes())
+            if self.listener is not None:
+                self.listener(block.copy())
+            self.frames_written += block_size
+            for handle in finished:
+                handle.finish()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._file.close()
+            self._thread = None
+
+# Real output device through the sounddevice (PortAudio) package
+class SoundDeviceOutput:
+    """
+    A block handed to PortAudio is played only at its outputBufferDacTime, so handles
+    that end in it are finished from a later callback, once the stream clock has
+    passed the block's last sample.
+    """
+
+    def __init__(self, device=None, latency='low'):
+        self.device = device
+        self.latency = latency
+        self._stream = None
+        self._unplayed = []  # (DAC time after the block, handle) awaiting playback
+
+    def start(self, callback, sample_rate, block_size, active):
+        import sounddevice
+
+        def portaudio_callback(outdata, frames, time_info, status):
+            dac_time = time_info.outputBufferDacTime
+            for handle in callback(outdata[:, 0], dac_time):
+                self._unplayed.append((dac_time + frames / sample_rate, handle))
+            now = time_info.currentTime
+            for end, handle in self._unplayed:
+                if end <= now:
+                    handle.finish()
+            self._unplayed = [(end, handle) for end, handle in self._unplayed if end > now]
+
+        self._stream = sounddevice.OutputStream(samplerate=sample_rate, blocksize=block_size, channels=1, dtype='float32',
+                                                device=self.device, latency=self.latency, callback=portaudio_callback)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        # Nothing more will be played; release anyone still waiting
+        for _, handle in self._unplayed:
+            handle.finish()
+        self._unplayed = []
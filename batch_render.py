@@ -0,0 +1,109 @@
+import argparse
+import os
+import numpy as np
+from tone_engine import get_template, batch_onsets
+from trial_lists import NO_TARGET, load_trial_list
+from audio_format import format_from_env
+
+# Constants
+BASE_FREQ = 523.25  # Hz
+DURATION = 0.08  # seconds
+SAMPLE_RATE = format_from_env().sample_rate  # Hz
+
+# Per-tone gains for a whole trial list
+def trial_gains(high_intensity_index, normal_amplitude, target_amplitude, seq_len=14):
+    """
+    `target_amplitude` may be a scalar or one value per trial. Trials whose index is
+    NO_TARGET keep every tone at `normal_amplitude`.
+    """
+    index = np.asarray(high_intensity_index)
+    if np.any((index != NO_TARGET) & ((index < 0) | (index >= seq_len))):
+        raise ValueError(f"high_intensity_index must be between 0 and {seq_len - 1}")
+    gains = np.full((len(index), seq_len), normal_amplitude, dtype=np.float64)
+    has_target = index != NO_TARGET
+    target_amplitude = np.broadcast_to(np.asarray(target_amplitude, dtype=np.float64), index.shape)
+    rows = np.nonzero(has_target)[0]
+    gains[rows, index[rows]] = target_amplitude[rows]
+    return gains
+
+# Render a block of trials into a padded (trials x samples) array with one scatter
+def _render_rows(onsets, gains, template, width, dtype):
+    rows = len(onsets)
+    audio = np.zeros((rows, width), dtype=dtype)
+    # Flat sample index of every tone sample: row offset + onset + position in the tone
+    flat = (np.arange(rows, dtype=np.int64)[:, None, None] * width + onsets[:, :, None]
+            + np.arange(len(template), dtype=np.int64)[None, None, :])
+    values = gains[:, :, None].astype(dtype) * template.astype(dtype)[None, None, :]
+    # Tones never overlap, so a plain fancy-index add is an exact scatter-add
+    audio.reshape(-1)[flat.reshape(-1)] += values.reshape(-1)
+    return audio
+
+# Render every trial of a list at once
+def render_batch(intervals, gains, frequency=BASE_FREQ, duration=DURATION, sample_rate=SAMPLE_RATE,
+                 dtype=np.float32, chunk_size=None):
+    """
+    Returns the padded (trials x samples) audio and each trial's length in samples;
+    samples past a trial's length are zero. With `chunk_size`, trials are rendered
+    that many at a time so the temporary index and value arrays stay bounded.
+    """
+    audio = None
+    lengths = None
+    for start, chunk, chunk_lengths, width in iter_render_batch(intervals, gains, frequency, duration, sample_rate,
+                                                                dtype, chunk_size or len(intervals)):
+        if audio is None:
+            audio = np.zeros((len(intervals), width), dtype=dtype)
+            lengths = np.empty(len(intervals), dtype=np.int64)
+        audio[start:start + len(chunk)] = chunk
+        lengths[start:start + len(chunk)] = chunk_lengths
+    return audio, lengths
+
+# Render a trial list chunk by chunk, yielding (first trial, audio, lengths, padded width)
+def iter_render_batch(intervals, gains, frequency=BASE_FREQ, duration=DURATION, sample_rate=SAMPLE_RATE,
+                      dtype=np.float32, chunk_size=16):
+    """
+    Every chunk is padded to the longest trial of the whole list, so chunks can be
+    written straight into one preallocated or memory-mapped output.
+    """
+    template = get_template(frequency, duration, sample_rate)
+    onsets, lengths = batch_onsets(intervals, len(template), sample_rate)
+    gains = np.asarray(gains, dtype=np.float64)
+    width = int(lengths.max())
+    for start in range(0, len(onsets), chunk_size):
+        stop = start + chunk_size
+        yield start, _render_rows(onsets[start:stop], gains[start:stop], template, width, dtype), lengths[start:stop], width
+
+# Render a trial list file to a padded .npy array plus a lengths file, chunk by chunk
+def export_trial_list(trial_list_filename, out_path, normal_amplitude, target_amplitude=None, chunk_size=16,
+                      dtype=np.float32, seq_len=14):
+    """
+    `target_amplitude` defaults to the list's percentage_increase column (JUDIT_gen_trials.py
+    lists); lists from gen.py need it given explicitly. Returns the lengths array.
+    """
+    columns = load_trial_list(trial_list_filename)
+    if target_amplitude is None:
+        if 'percentage_increase' not in columns:
+            raise ValueError(f"{trial_list_filename} has no percentage_increase column; pass target_amplitude")
+        target_amplitude = np.nan_to_num(columns['percentage_increase'], nan=normal_amplitude)
+    gains = trial_gains(columns['high_intensity_index'], normal_amplitude, target_amplitude, seq_len)
+
+    audio = None
+    lengths = np.empty(len(gains), dtype=np.int64)
+    for start, chunk, chunk_lengths, width in iter_render_batch(columns['intervals'], gains, dtype=dtype, chunk_size=chunk_size):
+        if audio is None:
+            audio = np.lib.format.open_memmap(out_path, mode='w+', dtype=dtype, shape=(len(gains), width))
+        audio[start:start + len(chunk)] = chunk
+        lengths[start:start + len(chunk)] = chunk_lengths
+    audio.flush()
+    np.save(f"{os.path.splitext(out_path)[0]}_lengths.npy", lengths)
+    return lengths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render every trial of a trial list to a padded (trials x samples) .npy file.")
+    parser.add_argument('trial_list', help="trial list CSV (the .npz next to it is used when present)")
+    parser.add_argument('out', help="output .npy path")
+    parser.add_argument('--normal-amplitude', type=float, default=0.5)
+    parser.add_argument('--target-amplitude', type=float, default=None, help="louder tone amplitude (default: percentage_increase column)")
+    parser.add_argument('--chunk-size', type=int, default=16, help="trials rendered per chunk")
+    args = parser.parse_args()
+    lengths = export_trial_list(args.trial_list, args.out, args.normal_amplitude, args.target_amplitude, args.chunk_size)
+    print(f"Rendered {len(lengths)} trials, longest {lengths.max() / SAMPLE_RATE:.3f} s")
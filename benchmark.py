@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+# Constants
+BENCH_SAMPLE_RATE = 96000  # Hz; passed explicitly to the synthesis cases, the rig's own format is left alone
+BASELINE_PATH = "benchmark_baseline.json"
+REPEATS = 5  # measurements per case
+MIN_REPEATS = 3
+TIME_TOLERANCE = 0.25  # default for a case's best time over its baseline best time
+MEMORY_TOLERANCE = 0.10  # a case regresses when its peak traced memory grows by more than this fraction
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run a callable from inside a directory, returning to the previous one afterwards
+def _in_directory(path, fn):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        return fn()
+    finally:
+        os.chdir(previous)
+
+# Set environment variables for the duration of a block and restore the previous values afterwards
+@contextlib.contextmanager
+def _environment(**values):
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+# Benchmark cases: each setup returns the callable to time, and `number` is the calls per measurement
+def bench_generate_tone():
+    from judit_engine import generate_tone, BASE_FREQ, DURATION, INTENSITY_NORMAL_DB
+    return lambda: generate_tone(BASE_FREQ, DURATION, BENCH_SAMPLE_RATE, INTENSITY_NORMAL_DB + 1.5)
+
+def bench_combine_tones():
+    from judit_engine import generate_tone, combine_tones, BASE_FREQ, DURATION, INTENSITY_NORMAL_DB, SEQ_LEN
+    tone = generate_tone(BASE_FREQ, DURATION, BENCH_SAMPLE_RATE, INTENSITY_NORMAL_DB)
+    sequence = [(tone, interval) for interval in np.linspace(0.1, 0.375, SEQ_LEN)]
+    return lambda: combine_tones(sequence, BENCH_SAMPLE_RATE)
+
+def bench_render_trial():
+    from judit_engine import render_sequence, DURATION, SEQ_LEN
+    from trial_lists import load_trial_plan
+    trials = load_trial_plan(os.path.join(REPO_DIR, "trialList", "JUDIT_1.csv"), int(BENCH_SAMPLE_RATE * DURATION),
+                             BENCH_SAMPLE_RATE, SEQ_LEN)
+    targets = [trial for trial in trials if trial.high_intensity_index is not None][:24]
+    return lambda: [render_sequence(trial.intervals, trial.high_intensity_index, 1.5, BENCH_SAMPLE_RATE) for trial in targets]
+
+def bench_render_batch():
+    from batch_render import render_batch, trial_gains
+    from trial_lists import load_trial_list
+    columns = load_trial_list(os.path.join(REPO_DIR, "trialList", "JUDIT_1.csv"))
+    gains = trial_gains(columns['high_intensity_index'], 10 ** (-6 / 20), 10 ** (-4.5 / 20))
+    return lambda: render_batch(columns['intervals'], gains, sample_rate=BENCH_SAMPLE_RATE, dtype=np.float32)
+
+def bench_load_trial_lists():
+    from trial_lists import load_trial_plan
+    from judit_engine import DURATION, SEQ_LEN
+    trial_dir = os.path.join(REPO_DIR, "trialList")
+    paths = sorted(os.path.join(trial_dir, name) for name in os.listdir(trial_dir)
+                   if name.startswith("JUDIT") and name.endswith(".csv"))
+    return lambda: [load_trial_plan(path, int(BENCH_SAMPLE_RATE * DURATION), BENCH_SAMPLE_RATE, SEQ_LEN) for path in paths]
+
+def bench_generate_structures():
+    import gen
+    import JUDIT_gen_trials
+
+    # Write into a scratch trialList/ so the repository's trial lists are left alone
+    def generate_all():
+        with tempfile.TemporaryDirectory() as scratch:
+            os.makedirs(os.path.join(scratch, "trialList"))
+            def run():
+                for structure_num in range(1, gen.NUM_STRUCTURES + 1):
+                    gen.generate_structure(structure_num, structure_num)
+                for condition in JUDIT_gen_trials.conditions:
+                    for structure_num in range(1, JUDIT_gen_trials.NUM_STRUCTURES + 1):
+                        JUDIT_gen_trials.generate_structure(condition, structure_num, structure_num)
+            _in_directory(scratch, run)
+    return generate_all
+
+def bench_headless_session():
+    import headless
+
+    # Full session (adaptive practice and all NUM_BLOCKS blocks) at the rig's configured format; its printout
+    # and progress bars are dropped and the environment is left as it was
+    def run_session():
+        with tempfile.TemporaryDirectory() as data_dir, contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()), _environment(JUDIT_DATA_DIR=data_dir, JUDIT_HEADLESS='1'):
+            _in_directory(REPO_DIR, lambda: headless.run_session('JUDIT_task_modified.py', dialog_data=['bench', False], seed=0))
+    return run_session
+
+# name: (setup, calls per measurement, time tolerance); file- and process-heavy cases are noisier
+CASES = {
+    'generate_tone': (bench_generate_tone, 200, TIME_TOLERANCE),
+    'combine_tones': (bench_combine_tones, 50, TIME_TOLERANCE),
+    'render_trial': (bench_render_trial, 1, TIME_TOLERANCE),
+    'render_batch': (bench_render_batch, 1, TIME_TOLERANCE),
+    'load_trial_lists': (bench_load_trial_lists, 1, 0.4),
+    'generate_structures': (bench_generate_structures, 1, 0.5),
+    'headless_session': (bench_headless_session, 1, 0.5),
+}
+
+# Median and best seconds per call over `repeats` measurements, and the traced peak of one call
+def measure(fn, number=1, repeats=REPEATS):
+    fn()  # warm caches and imports so the measurements see the steady state
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time_s': statistics.median(times), 'best_s': min(times), 'repeats': repeats, 'peak_mb': peak / 2**20}
+
+# Describe the machine a result was measured on
+def machine_info():
+    from audio_format import format_from_env
+
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpus': os.cpu_count(), 'system': platform.system(),
+            'audio_format': repr(format_from_env())}
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {'machine': None, 'cases': {}}
+    with open(path) as file:
+        return json.load(file)
+
+def save_baseline(baseline, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(baseline, file, indent=2)
+    os.replace(tmp_path, path)
+
+# Regressions of one case's result against its baseline, as readable strings
+def compare(result, reference, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Times are compared best against best: the fastest of several runs is far less
+    sensitive to other load on the machine than the median or a single run.
+    """
+    problems = []
+    if result['best_s'] > reference['best_s'] * (1 + time_tolerance):
+        problems.append(f"best time {result['best_s'] / reference['best_s']:.2f}x baseline")
+    if result['peak_mb'] > reference['peak_mb'] * (1 + memory_tolerance) + 0.1:
+        problems.append(f"peak memory {result['peak_mb']:.1f} MB vs {reference['peak_mb']:.1f} MB")
+    return problems
+
+# Run the selected cases, compare them with the stored baseline and optionally save them as the new baseline
+def run_benchmarks(names, repeats=REPEATS, baseline_path=BASELINE_PATH, save=False, time_tolerance=None,
+                   memory_tolerance=MEMORY_TOLERANCE):
+    """
+    Every case is measured at least MIN_REPEATS times. `time_tolerance` overrides the
+    per-case tolerances in CASES when given. Returns (results, regressions), where
+    regressions maps case names to their problems. Cases without a baseline are
+    reported but never count as regressions.
+    """
+    baseline = load_baseline(baseline_path)
+    if baseline['machine'] is not None and baseline['machine'] != machine_info():
+        print(f"Note: baseline was measured on {baseline['machine']}")
+
+    results, regressions = {}, {}
+    for name in names:
+        setup, number, case_tolerance = CASES[name]
+        result = measure(setup(), number, max(MIN_REPEATS, repeats))
+        results[name] = result
+        reference = baseline['cases'].get(name)
+        tolerance = case_tolerance if time_tolerance is None else time_tolerance
+        problems = compare(result, reference, tolerance, memory_tolerance) if reference else []
+        if problems:
+            regressions[name] = problems
+        status = "no baseline" if reference is None else ("REGRESSION: " + "; ".join(problems) if problems else "ok")
+        print(f"{name:<20} {result['time_s'] * 1000:10.3f} ms  (best {result['best_s'] * 1000:.3f} ms)  "
+              f"peak {result['peak_mb']:8.2f} MB  {status}")
+
+    if save:
+        baseline['machine'] = machine_info()
+        baseline['cases'].update(results)
+        save_baseline(baseline, baseline_path)
+        print(f"Saved {len(results)} baselines to {baseline_path}")
+    return results, regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark stimulus synthesis, generation, trial-list loading and a headless session.")
+    parser.add_argument('cases', nargs='*', help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help=f"measurements per case (at least {MIN_REPEATS})")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline file")
+    parser.add_argument('--save', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--time-tolerance', type=float, default=None, help="allowed fractional slowdown of every case (default: per case)")
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE, help="allowed fractional growth of peak memory")
+    args = parser.parse_args()
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    _, regressions = run_benchmarks(args.cases or list(CASES), args.repeats, args.baseline, args.save,
+                                    args.time_tolerance, args.memory_tolerance)
+    if regressions and not args.save:
+        raise SystemExit(f"{len(regressions)} case(s) regressed: {', '.join(regressions)}")
@@ -0,0 +1,195 @@
+import argparse
+import atexit
+import json
+import os
+import time
+import numpy as np
+from trial_lists import NO_TARGET
+
+# Constants
+LOG_NAME = "judit_events.bin"  # fixed-size binary records, appended only
+INDEX_NAME = "judit_events.index.json"  # sidecar: one entry per session with its record range
+INDEX_FIELDS = ('participant', 'structure', 'condition', 'date', 'task')
+KIND_TRIAL = 0  # main-task trial
+KIND_ADAPTIVE = 1  # adaptive tracking step
+EVENT_DTYPE = np.dtype([
+    ('session', '<u4'),  # position of the session in the index
+    ('kind', 'u1'),
+    ('trial_num', '<i4'),
+    ('periodic', 'i1'),
+    ('interval', '<f4'),  # chosen IOI/ITI in seconds; NaN for aperiodic trials
+    ('has_target', 'i1'),
+    ('high_intensity_index', '<i2'),  # NO_TARGET when no tone is louder
+    ('level', '<f4'),  # intensity change in the session's level_unit; NaN when not set
+    ('said_yes', 'i1'),
+    ('correct', 'i1'),
+    ('response_time', '<f4'),  # seconds; NaN for adaptive steps
+    ('timestamp', '<f8'),  # Unix time the record was written
+])
+
+def _read_index(path):
+    if not os.path.exists(path):
+        return {'dtype': EVENT_DTYPE.descr, 'sessions': []}
+    with open(path) as file:
+        return json.load(file)
+
+def _write_index(index, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(index, file, indent=1)
+    os.replace(tmp_path, path)
+
+# Appends one session's trials and adaptive steps to the event log of a data directory
+class EventLog:
+    """
+    Each record is a row of EVENT_DTYPE written straight to the end of LOG_NAME;
+    nothing already written is ever rewritten. Opening the log adds the session to
+    the sidecar index with its first record, and close() records where it stopped.
+    A session that never closed (e.g. after a crash) runs to the end of the file for
+    readers. One process should write to a data directory at a time.
+    """
+
+    def __init__(self, data_dir, participant, structure, condition=0, date='', task='', level_unit='dB'):
+        self.log_path = os.path.join(data_dir, LOG_NAME)
+        self.index_path = os.path.join(data_dir, INDEX_NAME)
+        self._file = open(self.log_path, 'ab')
+        # Start on a record boundary even if a previous writer died mid-record
+        self.start = os.path.getsize(self.log_path) // EVENT_DTYPE.itemsize
+        self._file.truncate(self.start * EVENT_DTYPE.itemsize)
+        self.count = 0
+        self._record = np.zeros(1, dtype=EVENT_DTYPE)
+
+        index = _read_index(self.index_path)
+        self.session = len(index['sessions'])
+        index['sessions'].append({'participant': str(participant), 'structure': str(structure), 'condition': int(condition),
+                                  'date': date, 'task': task, 'level_unit': level_unit, 'start': self.start, 'stop': None})
+        _write_index(index, self.index_path)
+        self._record['session'] = self.session
+        self._closed = False
+        atexit.register(self.close)
+
+    def _append(self, kind, trial_num, periodic, interval, has_target, high_intensity_index, level, said_yes, correct,
+                response_time):
+        record = self._record
+        record['kind'] = kind
+        record['trial_num'] = trial_num
+        record['periodic'] = periodic
+        record['interval'] = np.nan if interval is None else interval
+        record['has_target'] = has_target
+        record['high_intensity_index'] = NO_TARGET if high_intensity_index is None else high_intensity_index
+        record['level'] = np.nan if level is None else level
+        record['said_yes'] = said_yes
+        record['correct'] = correct
+        record['response_time'] = response_time
+        record['timestamp'] = time.time()
+        self._file.write(record.tobytes())
+        self._file.flush()
+        self.count += 1
+
+    # Record one main-task trial
+    def trial(self, trial_num, periodic, interval, has_target, high_intensity_index, level, said_yes, correct, response_time):
+        self._append(KIND_TRIAL, trial_num, periodic, interval, has_target, high_intensity_index, level, said_yes, correct,
+                     response_time)
+
+    # Record one adaptive tracking step; every adaptive trial has a louder tone
+    def adaptive(self, trial_num, interval, high_intensity_index, level, said_yes, correct):
+        self._append(KIND_ADAPTIVE, trial_num, 1, interval, 1, high_intensity_index, level, said_yes, correct, np.nan)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        os.fsync(self._file.fileno())
+        self._file.close()
+        index = _read_index(self.index_path)
+        index['sessions'][self.session]['stop'] = self.start + self.count
+        _write_index(index, self.index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Memory-mapped view of a data directory's event log
+class EventStore:
+    """
+    sessions() filters the sidecar index; query() reads only the record ranges of
+    the matching sessions from the memory map and then filters those records by
+    column, so asking for one participant or structure never touches the rest of
+    the log.
+    """
+
+    def __init__(self, data_dir):
+        log_path = os.path.join(data_dir, LOG_NAME)
+        self.index = _read_index(os.path.join(data_dir, INDEX_NAME))
+        if np.dtype([tuple(field) for field in self.index['dtype']]) != EVENT_DTYPE:
+            raise ValueError(f"{log_path} was written with a different record layout")
+        size = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        num_records = size // EVENT_DTYPE.itemsize
+        self.records = (np.memmap(log_path, dtype=EVENT_DTYPE, mode='r', shape=(num_records,))
+                        if num_records else np.zeros(0, dtype=EVENT_DTYPE))
+
+    # Index entries (with their session number) whose fields equal the given values
+    def sessions(self, **fields):
+        unknown = set(fields) - set(INDEX_FIELDS)
+        if unknown:
+            raise ValueError(f"Sessions can be filtered by {INDEX_FIELDS}, not {sorted(unknown)}")
+        return [dict(entry, session=number) for number, entry in enumerate(self.index['sessions'])
+                if all(entry[name] == value for name, value in fields.items())]
+
+    # Records of the matching sessions, filtered by column values
+    def query(self, kind=None, **filters):
+        """
+        Keyword arguments named after INDEX_FIELDS select sessions; any other keyword
+        must be an EVENT_DTYPE column and keeps the records equal to its value (or in
+        it, for a list or tuple). Returns a structured array in log order.
+        """
+        session_filters = {name: value for name, value in filters.items() if name in INDEX_FIELDS}
+        column_filters = {name: value for name, value in filters.items() if name not in INDEX_FIELDS}
+        unknown = set(column_filters) - set(EVENT_DTYPE.names)
+        if unknown:
+            raise ValueError(f"Unknown event columns: {sorted(unknown)}")
+        if kind is not None:
+            column_filters['kind'] = kind
+
+        parts = []
+        for entry in self.sessions(**session_filters):
+            stop = len(self.records) if entry['stop'] is None else entry['stop']
+            part = self.records[entry['start']:stop]
+            mask = part['session'] == entry['session']
+            for name, value in column_filters.items():
+                mask &= np.isin(part[name], value) if isinstance(value, (list, tuple)) else part[name] == value
+            parts.append(part[mask])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=EVENT_DTYPE)
+
+    # Index entry of the session a record belongs to
+    def session_of(self, record):
+        return self.index['sessions'][int(record['session'])]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the JUDIT event log of a data directory.")
+    parser.add_argument('data_dir', nargs='?', default='data/', help="directory holding the event log")
+    parser.add_argument('--participant', help="only this participant")
+    parser.add_argument('--structure', help="only this trial structure")
+    parser.add_argument('--condition', type=int, help="only this condition (JUDIT_task.py)")
+    parser.add_argument('--date', help="only sessions on this date (DD-MM-YYYY)")
+    parser.add_argument('--adaptive', action='store_true', help="adaptive tracking steps instead of main-task trials")
+    parser.add_argument('--periodic', type=int, choices=(0, 1), help="only periodic (1) or aperiodic (0) trials")
+    parser.add_argument('--index', type=int, help="only trials with the louder tone at this position")
+    args = parser.parse_args()
+
+    store = EventStore(args.data_dir)
+    filters = {name: getattr(args, name) for name in ('participant', 'structure', 'condition', 'date')
+               if getattr(args, name) is not None}
+    if args.periodic is not None:
+        filters['periodic'] = args.periodic
+    if args.index is not None:
+        filters['high_intensity_index'] = args.index
+    records = store.query(kind=KIND_ADAPTIVE if args.adaptive else KIND_TRIAL, **filters)
+    sessions = len(np.unique(records['session']))
+    if len(records):
+        print(f"{len(records)} records from {sessions} sessions: accuracy {records['correct'].mean():.3f}, "
+              f"yes rate {records['said_yes'].mean():.3f}")
+    else:
+        print(f"No matching records in {len(store.records)}")
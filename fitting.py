@@ -0,0 +1,176 @@
+import argparse
+import time
+import numpy as np
+from analysis import load_summaries, aggregate_main, corrected_rates, probit, prepare_output, write_dataset
+from staircase_sim import LEVELS, target_level
+from trial_lists import NO_TARGET
+
+# Constants
+THRESHOLDS = np.linspace(0.0, 6.0, 121)  # candidate logistic midpoints (dB)
+SLOPES = np.geomspace(0.05, 2.0, 24)  # candidate logistic spreads (dB)
+FALSE_ALARM_RATE = 0.1  # adaptive trials always contain a louder tone, so guessing and lapses are fixed
+LAPSE_RATE = 0.02
+TARGET = 1 / np.sqrt(2)  # P(yes) tracked by the 2-down/1-up staircase
+RESAMPLES = 1000
+CI = 95
+CHUNK_ELEMENTS = 2**24  # log-likelihood values evaluated per matrix product in the bootstrap
+PSYCHOMETRIC_COLUMNS = ['participant', 'n_trials', 'threshold_db', 'threshold_low', 'threshold_high',
+                        'midpoint_db', 'slope_db', 'slope_low', 'slope_high']
+SDT_COLUMNS = ['participant', 'condition', 'periodic', 'high_intensity_index', 'hit_rate', 'false_alarm_rate',
+               'd_prime', 'd_prime_low', 'd_prime_high', 'criterion', 'criterion_low', 'criterion_high']
+
+# Log-likelihood weights of every (level, response) count for every grid point
+def likelihood_weights(levels=LEVELS, thresholds=THRESHOLDS, slopes=SLOPES, false_alarm_rate=FALSE_ALARM_RATE,
+                       lapse_rate=LAPSE_RATE):
+    """
+    Returns a (2 * len(levels), len(thresholds) * len(slopes)) float32 matrix: the first
+    half of the rows are log P(yes), the second half log P(no). A participant's counts
+    of yes and no answers per level times this matrix is their log-likelihood over the
+    whole grid, so fitting many participants (or resamples) is one matrix product.
+    """
+    level = levels[:, None, None]
+    detect = 1 / (1 + np.exp(-(level - thresholds[None, :, None]) / slopes[None, None, :]))
+    p_yes = (false_alarm_rate + (1 - false_alarm_rate - lapse_rate) * detect).reshape(len(levels), -1)
+    return np.concatenate([np.log(p_yes), np.log(1 - p_yes)]).astype(np.float32)
+
+# Yes/no counts per level for each adaptive session, shape (sessions, 2 * len(levels))
+def response_counts(sessions, levels=LEVELS):
+    counts = np.zeros((len(sessions), 2 * len(levels)), dtype=np.int64)
+    for row, (session_levels, said_yes) in enumerate(sessions):
+        index = np.abs(np.asarray(session_levels)[:, None] - levels[None, :]).argmin(axis=1)
+        said_yes = np.asarray(said_yes, dtype=bool)
+        counts[row] = np.bincount(index + len(levels) * ~said_yes, minlength=2 * len(levels))
+    return counts
+
+# Maximum-likelihood grid point for every row of counts
+def grid_fit(counts, weights, thresholds=THRESHOLDS, slopes=SLOPES):
+    best = np.argmax(counts.astype(np.float32) @ weights, axis=-1)
+    return thresholds[best // len(slopes)], slopes[best % len(slopes)]
+
+# Fit the logistic psychometric function to every adaptive session at once, with bootstrap CIs
+def fit_psychometric(sessions, resamples=RESAMPLES, ci=CI, seed=None, levels=LEVELS, thresholds=THRESHOLDS,
+                     slopes=SLOPES, false_alarm_rate=FALSE_ALARM_RATE, lapse_rate=LAPSE_RATE, target=TARGET):
+    """
+    `sessions` is a list of (levels, said_yes) pairs. The model is staircase_sim.p_yes,
+    fitted by maximum likelihood over the threshold x slope grid. Each resample draws
+    every session's trials with replacement, which is a multinomial draw of its
+    (level, response) counts, so all sessions and resamples are fitted as stacked
+    matrix products. threshold_db is the level at P(yes) = target, clipped to the
+    level range like PsiEstimator.estimate; the CIs are percentile intervals.
+    """
+    if not sessions:
+        return {name: np.zeros(0, dtype=np.int64 if name == 'n_trials' else np.float64)
+                for name in PSYCHOMETRIC_COLUMNS if name != 'participant'}
+    weights = likelihood_weights(levels, thresholds, slopes, false_alarm_rate, lapse_rate)
+    counts = response_counts(sessions, levels)
+    # Staircases visit only part of the level range; drop (level, response) pairs no session has
+    used = counts.any(axis=0)
+    counts, weights = counts[:, used], weights[used]
+    n_trials = counts.sum(axis=1)
+    midpoint, slope = grid_fit(counts, weights, thresholds, slopes)
+
+    rng = np.random.default_rng(seed)
+    proportions = counts / n_trials[:, None]
+    boot_midpoint = np.empty((resamples, len(sessions)))
+    boot_slope = np.empty((resamples, len(sessions)))
+    chunk = max(1, CHUNK_ELEMENTS // max(1, len(sessions) * weights.shape[1]))
+    for start in range(0, resamples, chunk):
+        size = min(chunk, resamples - start)
+        draws = rng.multinomial(n_trials, proportions, size=(size, len(sessions)))
+        boot_midpoint[start:start + size], boot_slope[start:start + size] = grid_fit(draws, weights, thresholds, slopes)
+
+    def threshold(m, s):
+        return np.clip(target_level(m, s, target, false_alarm_rate, lapse_rate), levels[0], levels[-1])
+    tail = (100 - ci) / 2
+    boot_threshold = threshold(boot_midpoint, boot_slope)
+    return {
+        'n_trials': n_trials, 'threshold_db': threshold(midpoint, slope),
+        'threshold_low': np.percentile(boot_threshold, tail, axis=0),
+        'threshold_high': np.percentile(boot_threshold, 100 - tail, axis=0),
+        'midpoint_db': midpoint, 'slope_db': slope,
+        'slope_low': np.percentile(boot_slope, tail, axis=0), 'slope_high': np.percentile(boot_slope, 100 - tail, axis=0),
+    }
+
+# probit((k + 0.5) / (n + 1)) for integer arrays k <= n, via a table over the counts that occur
+def corrected_probit(k, n):
+    n_values, n_index = np.unique(n, return_inverse=True)
+    table = np.zeros((len(n_values), n_values.max() + 1))
+    for row, trials in enumerate(n_values):
+        table[row, :trials + 1] = probit((np.arange(trials + 1) + 0.5) / (trials + 1))
+    return table[np.broadcast_to(n_index.reshape(np.shape(n)), np.shape(k)), k]
+
+# d' and criterion with bootstrap CIs for arrays of hit and false-alarm counts
+def fit_sdt(hits, targets, false_alarms, non_targets, resamples=RESAMPLES, ci=CI, seed=None):
+    """
+    Resampling the trials of a cell with replacement is a binomial draw of its yes
+    count, so every row's resamples come from two binomial calls of shape
+    (resamples, rows). Rates use the log-linear correction of analysis.d_prime.
+    """
+    hits, targets, false_alarms, non_targets = (np.asarray(a, dtype=np.int64) for a in (hits, targets, false_alarms, non_targets))
+    if len(hits) == 0:
+        return {name: np.zeros(0) for name in SDT_COLUMNS[4:]}
+    rng = np.random.default_rng(seed)
+    boot_hits = rng.binomial(targets, hits / targets, size=(resamples, len(hits)))
+    boot_false_alarms = rng.binomial(non_targets, false_alarms / non_targets, size=(resamples, len(hits)))
+
+    def metrics(h, fa):
+        z_hit, z_false_alarm = corrected_probit(h, targets), corrected_probit(fa, non_targets)
+        return z_hit - z_false_alarm, -(z_hit + z_false_alarm) / 2
+    boot_d_prime, boot_criterion = metrics(boot_hits, boot_false_alarms)
+    tail = (100 - ci) / 2
+    hit_rate, false_alarm_rate = corrected_rates(hits, targets, false_alarms, non_targets)
+    d, criterion = metrics(hits, false_alarms)
+    return {
+        'hit_rate': hit_rate, 'false_alarm_rate': false_alarm_rate, 'd_prime': d,
+        'd_prime_low': np.percentile(boot_d_prime, tail, axis=0),
+        'd_prime_high': np.percentile(boot_d_prime, 100 - tail, axis=0), 'criterion': criterion,
+        'criterion_low': np.percentile(boot_criterion, tail, axis=0),
+        'criterion_high': np.percentile(boot_criterion, 100 - tail, axis=0),
+    }
+
+# Psychometric fits for every adaptive session in the summaries
+def fit_adaptive_sessions(summaries, resamples=RESAMPLES, ci=CI, seed=None):
+    adaptive = [summary for summary in summaries if summary['kind'] == 'adaptive' and summary['levels']]
+    fits = fit_psychometric([(summary['levels'], summary['correct']) for summary in adaptive], resamples, ci, seed)
+    fits['participant'] = np.array([summary['participant'] for summary in adaptive])
+    return fits
+
+# d' fits for every target row of the analysis.aggregate_main table
+def fit_main_sessions(summaries, resamples=RESAMPLES, ci=CI, seed=None):
+    table = aggregate_main(summaries)
+    keys = list(zip(table['participant'].tolist(), table['condition'].tolist(), table['periodic'].tolist()))
+    noise = {key: (n_yes, n) for key, index, n_yes, n in
+             zip(keys, table['high_intensity_index'].tolist(), table['n_yes'].tolist(), table['n_trials'].tolist())
+             if index == NO_TARGET}
+    rows = [row for row, (key, index) in enumerate(zip(keys, table['high_intensity_index'].tolist()))
+            if index != NO_TARGET and key in noise]
+    false_alarms, non_targets = (np.array([noise[keys[row]][i] for row in rows], dtype=np.int64) for i in (0, 1))
+    fits = fit_sdt(table['n_yes'][rows], table['n_trials'][rows], false_alarms, non_targets, resamples, ci, seed)
+    for name in ('participant', 'condition', 'periodic', 'high_intensity_index'):
+        fits[name] = table[name][rows]
+    return fits
+
+# Fit every session in a data directory and write both tables
+def run_fitting(data_dir, out_stem, resamples=RESAMPLES, ci=CI, seed=None, workers=1):
+    prepare_output(out_stem)
+    _, summaries, _ = load_summaries(data_dir, workers)
+    seeds = np.random.SeedSequence(seed).spawn(2)
+    psychometric = fit_adaptive_sessions(summaries, resamples, ci, seeds[0])
+    sdt = fit_main_sessions(summaries, resamples, ci, seeds[1])
+    write_dataset(psychometric, f"{out_stem}_psychometric", PSYCHOMETRIC_COLUMNS)
+    write_dataset(sdt, f"{out_stem}_sdt", SDT_COLUMNS)
+    return psychometric, sdt
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit psychometric functions and d' for every JUDIT session.")
+    parser.add_argument('data_dir', nargs='?', default='data/', help="directory with the session CSV files")
+    parser.add_argument('--out', default='judit_fits', help="output stem; writes <stem>_psychometric and <stem>_sdt .npz/.csv")
+    parser.add_argument('--resamples', type=int, default=RESAMPLES, help="bootstrap resamples per fit")
+    parser.add_argument('--ci', type=float, default=CI, help="confidence interval width in percent")
+    parser.add_argument('--seed', type=int, default=None, help="bootstrap seed")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes for parsing")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    psychometric, sdt = run_fitting(args.data_dir, args.out, args.resamples, args.ci, args.seed, args.workers)
+    print(f"Fitted {len(psychometric['participant'])} adaptive sessions and {len(sdt['participant'])} d' cells "
+          f"with {args.resamples} resamples in {time.perf_counter() - start:.2f}s")
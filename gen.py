@@ -1,74 +1,66 @@
 import os
 import numpy as np
-import random
 import csv
+from tone_engine import render_tone, assemble_sequence, sequence_onsets
+from stimulus_bank import write_bank
+from audio_format import format_from_env
+from trial_lists import write_trial_list
+from generation import incremental_build, parse_args
+from randomizer import balanced_structure
 
 # Constants
 BASE_FREQ = 523.25  # Hz
 DURATION = 0.08  # seconds
-INTENSITY_NORMAL = 0.5  # normalized intensity
-SAMPLE_RATE = 96000  # Hz
+INTENSITY_NORMAL = 10 ** (-6 / 20)  # normalized intensity, matches INTENSITY_NORMAL_DB in judit_engine.py
+AUDIO_FORMAT = format_from_env()  # sample rate and storage type, see audio_format.py
+SAMPLE_RATE = AUDIO_FORMAT.sample_rate  # Hz
 SEQ_LEN = 14
 TRIALS = 192  # number of trials
 NUM_STRUCTURES = 5  # number of different trial structures per condition
-MANIP_POS = [11, 12, 13, 14]  # positions where high intensity is manipulated
+NUM_BLOCKS = 6  # blocks the task splits each structure into
+IOIS = [0.2, 0.25]  # inter-onset intervals for periodic trials
+MAX_RUN = 3  # longest allowed run of one trial type
+MAX_FACTOR_RUN = 4  # longest allowed run of periodic/aperiodic or target/no-target trials
+MANIP_POS = [10, 11, 12, 13]  # positions where high intensity is manipulated (the last four of SEQ_LEN tones)
 
 # Function to generate tone
 def generate_tone(frequency, duration, sample_rate, amplitude):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    tone = amplitude * np.sin(2 * np.pi * frequency * t)
-    
-    # Apply envelope
-    attack_duration = int(sample_rate * 0.02)
-    release_duration = int(sample_rate * 0.02)
-    envelope = np.ones_like(tone)
-    envelope[:attack_duration] = np.linspace(0, 1, attack_duration)
-    envelope[-release_duration:] = np.linspace(1, 0, release_duration)
-    
-    tone = tone * envelope
-    
-    return tone
+    # The unit tone is rendered once per (frequency, duration, sample_rate) and scaled here
+    return render_tone(frequency, duration, sample_rate, amplitude, dtype=np.float32)
 
 # Function to create sequence
-def create_sequence(periodic, has_high_intensity, high_intensity_positions):
+def create_sequence(periodic, has_high_intensity, high_intensity_index, chosen_IOI, rng):
     sequence = []
-    high_intensity_index = None
-    chosen_IOI = random.choice([0.2, 0.25]) if periodic else None
     intervals = []
 
-    if has_high_intensity:
-        high_intensity_index = high_intensity_positions.pop()
-    
+    tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL)
     for i in range(SEQ_LEN):
-        interval = chosen_IOI if periodic else round(np.random.uniform(0.1, 0.375), 3)
+        interval = chosen_IOI if periodic else round(float(rng.uniform(0.1, 0.375)), 3)
         intervals.append(interval)
-        amplitude = INTENSITY_NORMAL
-        tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, amplitude)
         sequence.append((tone, interval))
     
     return sequence, has_high_intensity, high_intensity_index, chosen_IOI, intervals
 
 # Function to combine tones into one continuous sound
 def combine_tones(sequence, sample_rate):
-    combined_tone = np.array([], dtype=np.float32)
-    for tone, interval in sequence:
-        silence = np.zeros(int(sample_rate * interval), dtype=np.float32)
-        combined_tone = np.concatenate((combined_tone, tone, silence))
-    return combined_tone
+    return assemble_sequence(sequence, sample_rate, dtype=np.float32)
 
 # Function to generate and store sequences
-def generate_and_store_sequences(trial_types, high_intensity_positions, filename):
+def generate_and_store_sequences(structure, filename, rng, write_stimulus_bank=False):
     sequences = []
     with open(filename, 'w', newline='') as file:
         writer = csv.writer(file)
         writer.writerow(['trial_num', 'periodic', 'chosen_IOI', 'has_high_intensity', 'high_intensity_index', 'intervals'])
-        for trial_num, (periodic, has_high_intensity) in enumerate(trial_types):
-            sequence, has_high_intensity, high_intensity_index, chosen_IOI, intervals = create_sequence(periodic, has_high_intensity, high_intensity_positions)
-            combined_tone = combine_tones(sequence, SAMPLE_RATE)
+        for trial_num, trial in enumerate(structure):
+            periodic, has_high_intensity = trial['periodic'], trial['has_high_intensity']
+            sequence, has_high_intensity, high_intensity_index, chosen_IOI, intervals = create_sequence(periodic, has_high_intensity, trial['high_intensity_index'], trial['chosen_IOI'], rng)
+            # Only the onsets are needed here; the audio itself is rendered when a bank is written
+            onsets, length = sequence_onsets([len(tone) for tone, _ in sequence], intervals, SAMPLE_RATE)
             trial_data = {
                 'trial_num': trial_num,
                 'sequence': sequence,
-                'combined_tone': combined_tone,
+                'onsets': onsets,
+                'length': length,
                 'periodic': periodic,
                 'has_high_intensity': has_high_intensity,
                 'high_intensity_index': high_intensity_index,
@@ -77,13 +69,31 @@ def generate_and_store_sequences(trial_types, high_intensity_positions, filename
             }
             sequences.append(trial_data)
             writer.writerow([trial_num, periodic, chosen_IOI, has_high_intensity, high_intensity_index, intervals])
+    write_trial_list(filename, sequences)
+    if write_stimulus_bank:
+        # Render one trial at a time straight into the bank's memory map
+        buffers = (combine_tones(s['sequence'], SAMPLE_RATE) for s in sequences)
+        write_bank(filename, buffers, [s['onsets'] for s in sequences], SAMPLE_RATE, INTENSITY_NORMAL, AUDIO_FORMAT,
+                   frequency=BASE_FREQ, duration=DURATION, lengths=[s['length'] for s in sequences])
     return sequences
 
+# Generate one balanced trial structure from its own seeded generator
+def generate_structure(structure_num, seed, write_stimulus_bank=False):
+    rng = np.random.default_rng(seed)
+    structure = balanced_structure(rng, TRIALS, NUM_BLOCKS, MANIP_POS, IOIS, MAX_RUN, MAX_FACTOR_RUN)
+    filename = f"trialList/JUDIT_{structure_num}.csv"
+    generate_and_store_sequences(structure, filename, rng, write_stimulus_bank)
+    return filename
+
 # Generate multiple balanced trial structures and save them
-for i in range(1, NUM_STRUCTURES + 1):
-    trial_types = [(True, True), (True, False), (False, True), (False, False)] * (TRIALS // 4)
-    random.shuffle(trial_types)
-    high_intensity_positions = MANIP_POS * (TRIALS // len(MANIP_POS))
-    random.shuffle(high_intensity_positions)
-    filename = f"trialList/JUDIT_{i}.csv"
-    generate_and_store_sequences(trial_types, high_intensity_positions, filename)
+if __name__ == "__main__":
+    args = parse_args("Generate JUDIT trial structures.", NUM_STRUCTURES)
+    params = {'generator': 'gen.py', 'BASE_FREQ': BASE_FREQ, 'DURATION': DURATION, 'INTENSITY_NORMAL': INTENSITY_NORMAL,
+              'SAMPLE_RATE': SAMPLE_RATE, 'AUDIO_FORMAT': AUDIO_FORMAT.params(), 'SEQ_LEN': SEQ_LEN, 'TRIALS': TRIALS, 'NUM_BLOCKS': NUM_BLOCKS, 'IOIS': IOIS,
+              'MAX_RUN': MAX_RUN, 'MAX_FACTOR_RUN': MAX_FACTOR_RUN, 'MANIP_POS': MANIP_POS}
+    jobs = {f"trialList/JUDIT_{i}.csv": (i,) for i in range(1, args.structures + 1)}
+    print(f"Audio format: {AUDIO_FORMAT.describe(generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL))}")
+    rebuilt = incremental_build(generate_structure, jobs, params, args.seed, args.workers, args.bank, args.force)
+    print(f"Regenerated {len(rebuilt)} of {len(jobs)} structures")
+    for filename in rebuilt:
+        print(filename)
@@ -0,0 +1,71 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from manifest import MANIFEST_PATH, load_manifest, save_manifest, needs_rebuild, record_outputs, output_params
+from stimulus_bank import bank_paths
+from trial_lists import columnar_path
+
+# Seed for one structure, derived from the master seed and the structure's key
+def structure_seed(master_seed, *key):
+    """
+    The seed depends only on the master seed and the key (e.g. condition and structure
+    number), never on which worker runs the structure or in what order.
+    """
+    return np.random.SeedSequence(master_seed, spawn_key=tuple(int(k) for k in key))
+
+# Run fn(*args) for every task, across a process pool when workers > 1
+def run_tasks(fn, tasks, workers=1):
+    if workers <= 1:
+        return [fn(*args) for args in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, *args) for args in tasks]
+        return [future.result() for future in futures]
+
+# Files written for one trial list
+def output_paths(trial_list_filename, write_stimulus_bank=False):
+    paths = [trial_list_filename, columnar_path(trial_list_filename)]
+    if write_stimulus_bank:
+        paths.extend(bank_paths(trial_list_filename))
+    return paths
+
+# Regenerate only the trial lists whose parameters, seed or outputs changed
+def incremental_build(generate, jobs, params, master_seed, workers=1, write_stimulus_bank=False, force=False,
+                      manifest_path=MANIFEST_PATH):
+    """
+    `jobs` maps each trial list filename to its seed key, e.g. {"trialList/JUDIT_2_3.csv": (2, 3)}.
+    generate(*key, seed, write_stimulus_bank) must write that trial list. After the run
+    the manifest records the parameters, seed and output checksums of every rebuilt list.
+    Without a bank the audio format is left out of the parameters, so building on a rig
+    with another sample rate neither rebuilds the lists nor rewrites their entries.
+    Returns the filenames that were regenerated.
+    """
+    params = dict(output_params(params, write_stimulus_bank), write_stimulus_bank=write_stimulus_bank)
+    manifest = load_manifest(manifest_path)
+    todo = []
+    for filename, key in jobs.items():
+        seed = {'master_seed': master_seed, 'key': list(key)}
+        if force or needs_rebuild(manifest, filename, params, seed):
+            todo.append((filename, key, seed))
+
+    tasks = [(*key, structure_seed(master_seed, *key), write_stimulus_bank) for _, key, _ in todo]
+    run_tasks(generate, tasks, workers)
+    for filename, _, seed in todo:
+        # A bank left over from an earlier build would no longer match the new trial list
+        if not write_stimulus_bank:
+            for path in bank_paths(filename):
+                if os.path.exists(path):
+                    os.remove(path)
+        record_outputs(manifest, filename, params, seed, output_paths(filename, write_stimulus_bank))
+    save_manifest(manifest, manifest_path)
+    return [filename for filename, _, _ in todo]
+
+# Command line options shared by the trial generators
+def parse_args(description, num_structures, argv=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--seed', type=int, default=0, help="master seed; outputs are identical for the same seed")
+    parser.add_argument('--structures', type=int, default=num_structures, help="number of trial structures to generate")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes")
+    parser.add_argument('--bank', action='store_true', help="also save the rendered audio next to each trial list")
+    parser.add_argument('--force', action='store_true', help="regenerate every structure even if the manifest is up to date")
+    return parser.parse_args(argv)
@@ -0,0 +1,228 @@
+"""
+Headless backend for running the JUDIT task scripts without a display or audio device.
+
+The task scripts import `visual`, `core`, `event`, `sound`, `gui`, `data` and `monitors`
+from here instead of PsychoPy when JUDIT_HEADLESS=1. Screens and sounds go to null sinks,
+waits advance a virtual clock instead of sleeping, and responses come from a simulated
+observer that listens to every played sequence.
+"""
+import math
+import os
+import random
+import runpy
+import time
+from types import SimpleNamespace
+import numpy as np
+
+# Simulated listener with a logistic psychometric function and lognormal RTs
+class SimulatedObserver:
+    """
+    The louder tone is detected from the played audio itself: the peak level of the
+    sequence relative to `reference_amplitude` gives the intensity change in dB.
+    P(yes) rises from `false_alarm_rate` towards 1 - `lapse_rate` with a logistic of
+    (change - threshold_db) / slope_db.
+    """
+
+    def __init__(self, threshold_db=1.5, slope_db=0.5, false_alarm_rate=0.1, lapse_rate=0.02,
+                 reference_amplitude=10 ** (-6 / 20), rt_median=0.6, rt_sigma=0.35, seed=None):
+        self.threshold_db = threshold_db
+        self.slope_db = slope_db
+        self.false_alarm_rate = false_alarm_rate
+        self.lapse_rate = lapse_rate
+        self.reference_amplitude = reference_amplitude
+        self.rt_median = rt_median
+        self.rt_sigma = rt_sigma
+        self.rng = np.random.default_rng(seed)
+
+    # Probability of answering "yes" for a given intensity change (None when no tone is louder)
+    def p_yes(self, intensity_change_db):
+        if intensity_change_db is None:
+            return self.false_alarm_rate
+        detect = 1 / (1 + math.exp(-(intensity_change_db - self.threshold_db) / self.slope_db))
+        return self.false_alarm_rate + (1 - self.false_alarm_rate - self.lapse_rate) * detect
+
+    # Intensity change of the loudest tone in a sequence, or None if all tones are equal
+    def intensity_change_db(self, samples):
+        peak = float(np.abs(samples).max()) if len(samples) else 0.0
+        if peak <= 0:
+            return None
+        change = 20 * math.log10(peak / self.reference_amplitude)
+        return change if change > 0.01 else None
+
+    # Answer 'y' or 'n' for the last played sequence, with a response time in seconds
+    def respond(self, samples):
+        change = self.intensity_change_db(samples) if samples is not None else None
+        key = 'y' if self.rng.random() < self.p_yes(change) else 'n'
+        rt = float(self.rt_median * math.exp(self.rt_sigma * self.rng.standard_normal()))
+        return key, rt
+
+# State of the running headless session
+class _Session:
+    def __init__(self, observer, dialog_data):
+        self.observer = observer
+        self.dialog_data = dialog_data
+        self.now = 0.0
+        self.last_samples = None
+        self.trials_played = 0
+        self.heard = []
+
+_session = _Session(SimulatedObserver(), ['sim', False])
+
+# Clock that reads the virtual session time
+class Clock:
+    def __init__(self):
+        self._start = _session.now
+
+    def getTime(self):
+        return _session.now - self._start
+
+    def reset(self, newT=0.0):
+        self._start = _session.now + newT
+
+def wait(secs, hogCPUperiod=0.2):
+    _session.now += max(0.0, secs)
+
+def getTime():
+    return _session.now
+
+def quit():
+    raise SystemExit(0)
+
+# Null sinks for windows and text
+class Window:
+    def __init__(self, *args, **kwargs):
+        self.closed = False
+
+    def flip(self, clearBuffer=True):
+        return _session.now
+
+    def close(self):
+        self.closed = True
+
+class TextStim:
+    def __init__(self, win=None, text='', **kwargs):
+        self.win = win
+        self.text = text
+        self.pos = kwargs.get('pos', (0, 0))
+        self.height = kwargs.get('height')
+
+    def setText(self, text):
+        self.text = text
+
+    def setPos(self, pos):
+        self.pos = pos
+
+    def setHeight(self, height):
+        self.height = height
+
+    def draw(self, win=None):
+        pass
+
+class Mouse:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def setVisible(self, visible):
+        pass
+
+# Keyboard input: response keys come from the observer, anything else is pressed at once
+def waitKeys(keyList=None, timeStamped=False, **kwargs):
+    if keyList is not None and 'y' in keyList and 'n' in keyList:
+        if _session.heard:
+            # The sequence was streamed block by block rather than played as one Sound
+            _session.last_samples = np.concatenate(_session.heard)
+            _session.heard = []
+            _session.trials_played += 1
+        key, rt = _session.observer.respond(_session.last_samples)
+        wait(rt)
+    else:
+        key = keyList[0] if keyList else 'space'
+    if timeStamped:
+        return [[key, timeStamped.getTime()]]
+    return [key]
+
+# Null audio sink that hands every played buffer to the observer
+class Sound:
+    def __init__(self, value=None, sampleRate=44100, **kwargs):
+        self.samples = value
+        self.sampleRate = sampleRate
+
+    def setSound(self, value, **kwargs):
+        self.samples = value
+
+    def getDuration(self):
+        return len(self.samples) / self.sampleRate
+
+    def play(self, **kwargs):
+        _session.last_samples = self.samples
+        _session.trials_played += 1
+
+    def stop(self, **kwargs):
+        pass
+
+# Listener for audio_stream.FileOutputDevice: collects streamed blocks for the observer
+def hear(block):
+    _session.heard.append(block)
+
+# Participant dialog filled from the session's dialog data
+class Dlg:
+    def __init__(self, title='', **kwargs):
+        self.data = []
+
+    def addField(self, label, initial='', **kwargs):
+        pass
+
+    def show(self):
+        self.data = list(_session.dialog_data)
+        self.OK = True
+        return self.data
+
+class Monitor:
+    def __init__(self, name, **kwargs):
+        self.name = name
+
+    def setWidth(self, width):
+        pass
+
+    def setDistance(self, distance):
+        pass
+
+    def setSizePix(self, size):
+        pass
+
+# Stand-ins for the PsychoPy modules used by the task scripts
+visual = SimpleNamespace(Window=Window, TextStim=TextStim)
+core = SimpleNamespace(Clock=Clock, wait=wait, getTime=getTime, quit=quit)
+event = SimpleNamespace(Mouse=Mouse, waitKeys=waitKeys)
+sound = SimpleNamespace(Sound=Sound)
+gui = SimpleNamespace(Dlg=Dlg)
+data = SimpleNamespace()
+monitors = SimpleNamespace(Monitor=Monitor)
+
+# Run one complete session of a task script against a simulated observer
+def run_session(script='JUDIT_task_modified.py', observer=None, dialog_data=None, seed=None):
+    """
+    `dialog_data` is what the participant dialog returns, e.g. ['sim01', False] for
+    JUDIT_task_modified.py or ['sim01', 1, False] for JUDIT_task.py (whose observer
+    should use reference_amplitude=0.5). Set JUDIT_DATA_DIR to keep simulated
+    output apart from real participant data. Returns the script's globals after
+    main() finishes and what main() returned (the judit_engine.Session for
+    JUDIT_task_modified.py), together with the virtual session duration and
+    wall-clock time.
+    """
+    global _session
+    _session = _Session(observer or SimulatedObserver(seed=seed), dialog_data or ['sim', False])
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    os.environ['JUDIT_HEADLESS'] = '1'
+    start = time.perf_counter()
+    namespace = runpy.run_path(script, run_name='judit_headless')
+    session = None
+    try:
+        session = namespace['main']()
+    except SystemExit:
+        pass
+    return SimpleNamespace(namespace=namespace, session=session, session_time=_session.now,
+                           wall_time=time.perf_counter() - start, trials_played=_session.trials_played)
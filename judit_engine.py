@@ -0,0 +1,550 @@
+"""
+Importable engine for the JUDIT task (JUDIT_task_modified.py is its launcher).
+
+Importing this module only loads NumPy and the repo's own light modules, so the
+tone, trial and staircase code can be used from tests and tools. PsychoPy, psutil
+and tqdm are imported when a backend is loaded or a session runs, and nothing
+opens a window or a dialog until a Session is constructed explicitly.
+"""
+import datetime
+import os
+import random
+from types import SimpleNamespace
+import numpy as np
+from tone_engine import render_tone, assemble_sequence, sequence_onsets
+from prefetch import BlockPrefetcher
+from stimulus_bank import load_bank
+from stimulus_cache import StimulusCache, stimulus_key
+from trial_lists import load_trial_plan
+from results import ResultWriter, close_all
+from timing import TimingLog
+from event_log import EventLog
+from manifest import verify_trial_list, candidate_trial_lists
+from stimulus_pool import SoundPool, ScreenCache
+from audio_format import format_from_env
+
+# Define constants used throughout the experiment
+BASE_FREQ = 523.25  # Base frequency for tone generation in Hz
+DURATION = 0.08  # Duration of each tone in seconds
+INTENSITY_NORMAL_DB = -6  # Default sound intensity in decibels
+AUDIO_FORMAT = format_from_env()  # Sample rate and storage type of trial audio (see audio_format.py)
+SAMPLE_RATE = AUDIO_FORMAT.sample_rate  # Sampling rate for the audio in Hz
+FIXATION_TIME = 1  # Duration for fixation cross display in seconds
+SEQ_LEN = 14  # Number of tones in a sequence
+NUM_BLOCKS = 6  # Number of experimental blocks
+PREFETCH_DEPTH = None  # Trials rendered ahead of the trial loop (None renders the whole block)
+STIMULUS_CACHE_BYTES = 64 * 2**20  # Memory budget for trial audio that can recur (periodic and adaptive sequences)
+RECORD_TIMING = True  # Log per-trial phase timings alongside the behavioral data
+ADAPTIVE_ENGINE = 'staircase'  # Threshold tracking before the main task: 'staircase' or 'psi'
+AUDIO_OUTPUT = 'buffer'  # 'buffer' plays one Sound per trial, 'stream' schedules tones on a callback stream
+
+# Parameters for adaptive tracking
+INITIAL_INTENSITY_CHANGE_DB = 3  # Initial intensity change in dB for adaptive tracking
+MIN_INTENSITY_CHANGE_DB = 0.125  # Minimum intensity change
+MAX_INTENSITY_CHANGE_DB = 6  # Maximum intensity change
+STEP_SIZE_DB = 0.125  # Step size for adjusting intensity change
+ADAPTIVE_TRIALS = 36  # Number of adaptive trials per block
+ADAPTIVE_TRACKING_BLOCKS = 3  # Number of adaptive tracking blocks
+ADAPTIVE_INTERVAL = 0.15  # Interval between tones in adaptive trials, in seconds
+
+# Monitor configuration for consistent display
+MONITOR_NAME = 'defaultMonitor'
+MONITOR_WIDTH = 53.0  # Monitor width in centimeters
+MONITOR_DISTANCE = 60.0  # Viewing distance in centimeters
+MONITOR_RESOLUTION = [1920, 1080]  # Resolution of the monitor
+
+# Screen texts
+INSTRUCTIONS_TEXT = """
+Welcome to the experiment. \n\n
+In this task, you will hear a series of tones. You need to decide if any of the tones differed in intensity from the others.
+Press 'y' for Yes if you think there was a different tone, and 'n' for No if you think all tones were the same.\n\n
+Press the space bar to continue."""
+PRACTICE_INSTRUCTIONS_TEXT = """This is a practice phase.\n
+    You will hear a series of tones and need to decide if any of them differed in intensity.
+    Press 'y' for Yes and 'n' for No.\n
+    Press the space bar to begin."""
+RESPONSE_PROMPT = """Was there a louder tone?\n\nYes (y)     /     No (n)"""
+NEXT_BLOCK_TEXT = """Press Space to continue to next block.\n\n"""
+RESULT_COLUMNS = ['participant_number', 'periodic', 'chosen_ITI', 'has_high_intensity', 'trial_num', 'high_intensity_index', 'user_response', 'correct_answer', 'correct', 'response_time']
+ADAPTIVE_COLUMNS = ['trial_num', 'intensity_change_db', 'user_response', 'correct']
+STREAM_ONSET_COLUMNS = ['kind', 'trial_num', 'onset_error_ms'] + [f"onset_{i + 1}_s" for i in range(SEQ_LEN)]
+
+# Convert dB value to amplitude
+def db_to_amplitude(db):
+    return 10 ** (db / 20)
+
+# Generate a single tone with specified parameters
+def generate_tone(frequency, duration, sample_rate, db):
+    return render_tone(frequency, duration, sample_rate, db_to_amplitude(db), dtype=np.float32)
+
+# Combine individual tones into a sequence with specified intervals
+def combine_tones(sequence, sample_rate):
+    return assemble_sequence(sequence, sample_rate, dtype=np.float32)
+
+# Render a tone sequence in the storage type of AUDIO_FORMAT
+def render_sequence(intervals, high_intensity_index, intensity_change_db, sample_rate=SAMPLE_RATE):
+    sequence = []
+    normal_tone = generate_tone(BASE_FREQ, DURATION, sample_rate, INTENSITY_NORMAL_DB)
+    for i in range(SEQ_LEN):
+        interval = intervals[i]
+        if i == high_intensity_index:
+            tone = generate_tone(BASE_FREQ, DURATION, sample_rate, INTENSITY_NORMAL_DB + intensity_change_db)
+        else:
+            tone = normal_tone
+        sequence.append((tone, interval))
+    return AUDIO_FORMAT.encode(combine_tones(sequence, sample_rate))
+
+# Tones of a sequence for the streaming output; nothing is mixed until the device asks for it
+def sequence_tones(high_intensity_index, intensity_change_db):
+    normal_tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL_DB)
+    tones = [normal_tone] * SEQ_LEN
+    if high_intensity_index is not None:
+        tones[high_intensity_index] = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL_DB + intensity_change_db)
+    return tones
+
+# 2-down/1-up staircase on the intensity change, reporting a moving average of the last three levels
+class Staircase:
+    def __init__(self, start_db=INITIAL_INTENSITY_CHANGE_DB, min_db=MIN_INTENSITY_CHANGE_DB,
+                 max_db=MAX_INTENSITY_CHANGE_DB, step_db=STEP_SIZE_DB, window=3):
+        self.level = start_db
+        self.min_db = min_db
+        self.max_db = max_db
+        self.step_db = step_db
+        self.window = window
+        self.correct_responses = 0
+        self.incorrect_responses = 0
+        self.recent_levels = []
+
+    # Adjust the level after a response and return the moving average
+    def update(self, correct):
+        if correct:
+            self.correct_responses += 1
+            self.incorrect_responses = 0
+            if self.correct_responses >= 2:
+                self.level = max(self.min_db, self.level - self.step_db)
+                self.correct_responses = 0
+        else:
+            self.incorrect_responses += 1
+            self.correct_responses = 0
+            if self.incorrect_responses >= 1:
+                self.level = min(self.max_db, self.level + self.step_db)
+                self.incorrect_responses = 0
+
+        self.recent_levels.append(self.level)
+        if len(self.recent_levels) > self.window:
+            self.recent_levels.pop(0)
+        return sum(self.recent_levels) / len(self.recent_levels)
+
+# Import the PsychoPy modules, or the headless stand-ins when running against a simulated observer
+def load_backend(headless=False):
+    if headless:
+        import headless as backend
+        return SimpleNamespace(headless=True, visual=backend.visual, core=backend.core, event=backend.event,
+                               sound=backend.sound, gui=backend.gui, monitors=backend.monitors)
+
+    from psychopy import prefs
+    prefs.hardware['audioLib'] = ['PTB']
+
+    import psutil
+    # Set the priority of the process to high to ensure the experiment runs smoothly without interruptions
+    p = psutil.Process()
+    p.nice(psutil.HIGH_PRIORITY_CLASS)
+
+    from psychopy import visual, core, event, sound, gui, monitors
+    return SimpleNamespace(headless=False, visual=visual, core=core, event=event, sound=sound, gui=gui, monitors=monitors)
+
+# Collect the participant number and whether to skip practice
+def ask_participant(backend):
+    dialogue = backend.gui.Dlg(title="JUDIT")
+    dialogue.addField('Participant number:')
+    dialogue.addField('Skip practice phase?', initial=False)
+    dialogue.show()
+    return dialogue.data[0], bool(dialogue.data[1])
+
+# One participant's session: window, stimuli, output files and the trial procedures
+class Session:
+    """
+    Constructing a Session opens the window; run() shows the instructions, runs the
+    adaptive practice (unless skipped) and the main blocks, and closes everything.
+    """
+
+    def __init__(self, backend, participant_number, skip_practice=False, data_dir=None, audio_output=AUDIO_OUTPUT,
+                 adaptive_engine=ADAPTIVE_ENGINE, record_timing=RECORD_TIMING):
+        self.backend = backend
+        self.participant_number = participant_number
+        self.skip_practice = skip_practice
+        self.audio_output = audio_output
+        self.adaptive_engine = adaptive_engine
+        self.record_timing = record_timing
+        self.today = datetime.datetime.now().strftime('%d-%m-%Y')
+
+        # Prepare directory for saving data
+        self.data_dir = data_dir or os.environ.get('JUDIT_DATA_DIR', 'data/')
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        visual = backend.visual
+        mon = backend.monitors.Monitor(MONITOR_NAME)
+        mon.setWidth(MONITOR_WIDTH)
+        mon.setDistance(MONITOR_DISTANCE)
+        mon.setSizePix(MONITOR_RESOLUTION)
+
+        # Create a window for displaying the experiment
+        self.win = visual.Window(monitor=mon, fullscr=True, color=(-0.1, -0.1, -0.1))
+        self.fixation = visual.TextStim(self.win, text='+', height=0.1, color=(1, 1, 1))
+        self.mouse = backend.event.Mouse(win=self.win)
+        self.mouse.setVisible(False)
+
+        # Fixed screens are laid out once and redrawn; trial audio reuses a couple of Sound objects
+        self.screens = ScreenCache(self.win, visual.TextStim, pos=(0, 0))
+        self.screens.get('instructions', INSTRUCTIONS_TEXT, wrapWidth=1.5)
+        self.screens.get('response', RESPONSE_PROMPT, height=0.1)
+        self.sound_pool = SoundPool(backend.sound.Sound, SAMPLE_RATE)
+
+        # Rendered trial audio shared between acoustically identical trials
+        self.stimulus_cache = StimulusCache(max_bytes=STIMULUS_CACHE_BYTES)
+        # Per-trial phase timings; replaced with a file-backed log when the session starts
+        self.timing_log = TimingLog(FIXATION_TIME, enabled=False)
+        # Callback-driven output used when audio_output is 'stream'; opened in run()
+        self.tone_stream = None
+        self.stream_onset_errors = []  # Largest played-vs-scheduled inter-onset deviation of each streamed trial
+        self.onset_writer = None  # Device time of every streamed tone onset; opened in run() when streaming
+        self.adaptive_tracking_data = []  # Data from adaptive trials
+        self.results_writer = None
+        self.adaptive_writer = None
+        self.event_log = None  # Binary per-trial log shared by all sessions in data_dir; opened in run()
+
+    # Display instructions and wait for space bar press
+    def show_instructions(self):
+        self.screens.show('instructions', INSTRUCTIONS_TEXT)
+        self.backend.event.waitKeys(keyList=['space'])
+
+    # Load trial structure from CSV files in a directory
+    def load_trial_structure(self):
+        trial_list_path = "trialList/"
+        # Only gen.py's JUDIT_<n>.csv lists; JUDIT_gen_trials.py's JUDIT_<condition>_<n>.csv use other levels
+        structure_files = candidate_trial_lists(trial_list_path, r"JUDIT_\d+\.csv", 'gen.py')
+        chosen_filename = random.choice(structure_files)
+        # Refuse trial lists whose generation parameters or files no longer match the manifest
+        verify_trial_list(trial_list_path + chosen_filename, {'BASE_FREQ': BASE_FREQ, 'DURATION': DURATION, 'SAMPLE_RATE': SAMPLE_RATE,
+                                                              'SEQ_LEN': SEQ_LEN, 'INTENSITY_NORMAL': db_to_amplitude(INTENSITY_NORMAL_DB)})
+        trial_data = load_trial_plan(trial_list_path + chosen_filename, int(SAMPLE_RATE * DURATION), SAMPLE_RATE, SEQ_LEN)
+        structure_number = chosen_filename.split('_')[-1].split('.')[0]
+
+        # Memory-map the pre-rendered audio if the generator saved a stimulus bank
+        bank = load_bank(trial_list_path + chosen_filename, sample_rate=SAMPLE_RATE)
+        if bank is not None and not np.isclose(bank.amplitude, db_to_amplitude(INTENSITY_NORMAL_DB)):
+            raise ValueError(f"Stimulus bank for {chosen_filename} was rendered at amplitude {bank.amplitude}, expected {db_to_amplitude(INTENSITY_NORMAL_DB)}")
+        if bank is not None and bank.format.dtype != AUDIO_FORMAT.dtype:
+            raise ValueError(f"Stimulus bank for {chosen_filename} is stored as {bank.format.dtype}, expected {AUDIO_FORMAT.dtype}")
+        return trial_data, structure_number, bank
+
+    # Synthesize the audio for a single trial, in the storage type of AUDIO_FORMAT
+    def render_trial(self, trial, intensity_change_db=3, bank=None):
+        high_intensity_index = trial.high_intensity_index  # Index of the high intensity tone
+
+        # The bank holds the normal-intensity sequence; only the louder tone is written at runtime
+        if bank is not None:
+            trial_num = trial.trial_num
+            combined_tone = bank[trial_num]
+            if high_intensity_index is not None:
+                combined_tone = np.array(combined_tone)
+                onset = bank.onsets[trial_num][high_intensity_index]
+                tone = generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL_DB + intensity_change_db)
+                combined_tone[onset:onset + len(tone)] = bank.format.encode(tone)
+            return combined_tone
+
+        intervals = trial.intervals  # Time intervals between tones
+        # Aperiodic intervals are drawn for each trial and never recur, so they bypass the cache
+        if not trial.periodic:
+            return render_sequence(intervals, high_intensity_index, intensity_change_db)
+        return self.synthesize_sequence(intervals, high_intensity_index, intensity_change_db)
+
+    # Build a tone sequence, reusing the cached buffer when an identical one was already rendered
+    def synthesize_sequence(self, intervals, high_intensity_index, intensity_change_db):
+        if high_intensity_index is None:
+            intensity_change_db = None
+        key = stimulus_key(intervals, high_intensity_index, intensity_change_db, SAMPLE_RATE)
+        return self.stimulus_cache.get(key, lambda: render_sequence(intervals, high_intensity_index, intensity_change_db))
+
+    # Open the streaming output: a file-backed fake device when headless, the sound card otherwise
+    def open_tone_stream(self):
+        from audio_stream import ToneStream, FileOutputDevice, SoundDeviceOutput
+
+        if self.backend.headless:
+            from headless import hear
+            device = FileOutputDevice(os.environ.get('JUDIT_STREAM_FILE', os.devnull), listener=hear)
+        else:
+            device = SoundDeviceOutput()
+        return ToneStream(device, SAMPLE_RATE)
+
+    # Show the fixation cross, then play the trial audio and wait until it has finished
+    def play_after_fixation(self, timer, combined_tone=None, tones=None, onsets=None, length=None, kind='main',
+                            trial_num=None):
+        """
+        Plays `combined_tone` as one Sound, or streams `tones` at `onsets` (samples) when
+        they are given; `length` is then the samples of the whole sequence, so both
+        outputs wait through the silence after the last tone. Streamed trials write the device time of every tone onset to the
+        stream onset file, labelled with `kind` and `trial_num`. Returns the duration of
+        the audio in seconds.
+        """
+        core = self.backend.core
+        self.fixation.draw()  # Display fixation cross
+        self.win.flip()
+        timer.mark()  # fixation_flip
+
+        if tones is not None:
+            # The stream mixes the tones itself, so nothing has to be built before onset
+            fixation_clock = core.Clock()
+            timer.mark()  # sound_creation
+            core.wait(max(0, FIXATION_TIME - fixation_clock.getTime()))
+            timer.mark()  # fixation_wait
+            handle = self.tone_stream.play_sequence(tones, onsets, length)
+            timer.mark()  # play
+            core.wait(handle.duration)
+            handle.wait()  # Returns once the last sample has reached the device
+            timer.mark()  # playback_wait
+            onset_error = handle.onset_error()
+            self.stream_onset_errors.append(onset_error)
+            if self.onset_writer is not None:
+                self.onset_writer.write([kind, trial_num, '' if onset_error is None else round(onset_error * 1000, 3)] +
+                                        ['' if time is None else round(time, 6) for time in handle.onset_times])
+            return handle.duration
+
+        # Build the sound during the fixation period so it does not delay onset
+        fixation_clock = core.Clock()
+        tone_obj = self.sound_pool.acquire(AUDIO_FORMAT.decode(combined_tone))
+        timer.mark()  # sound_creation
+        core.wait(max(0, FIXATION_TIME - fixation_clock.getTime()))  # Wait for a fixed amount of time
+        timer.mark()  # fixation_wait
+
+        # Play the combined tone sequence
+        tone_obj.play()
+        timer.mark()  # play
+        core.wait(tone_obj.getDuration())  # Wait until tone playback is complete
+        timer.mark()  # playback_wait
+        tone_obj.stop()  # Stop the tone playback
+        return tone_obj.getDuration()
+
+    # Show the response prompt and wait for 'y' or 'n'; escape ends the session
+    def collect_response(self, timer, duration):
+        response_clock = self.backend.core.Clock()
+        self.screens.show('response', RESPONSE_PROMPT)
+        timer.mark()  # response_flip (includes stopping the sound)
+        self.timing_log.finish(timer, duration)
+        response_clock.reset()
+        keys = self.backend.event.waitKeys(keyList=['y', 'n', 'escape'], timeStamped=response_clock)
+        if 'escape' in [key[0] for key in keys]:
+            close_all()  # Write out any queued results before quitting
+            self.win.close()
+            self.backend.core.quit()  # Exit if escape is pressed
+        return keys
+
+    # Run a single trial based on provided trial data
+    def run_trial(self, trial, practice=False, intensity_change_db=3, prefetcher=None):
+        trial_num = trial.trial_num  # Extract trial number
+        periodic = trial.periodic  # Whether the tones are periodic
+        has_high_intensity = trial.has_high_intensity  # If there is a tone with higher intensity
+        chosen_IOI = trial.chosen_IOI  # Inter-onset interval
+        high_intensity_index = trial.high_intensity_index  # Index of the high intensity tone
+        timer = self.timing_log.start('main', trial_num)
+
+        # Stream the tones, or use the prefetched audio when available and otherwise synthesize it now
+        if self.audio_output == 'stream':
+            tones = sequence_tones(high_intensity_index, intensity_change_db)
+            timer.mark()  # synthesis
+            duration = self.play_after_fixation(timer, tones=tones, onsets=trial.onsets, length=trial.length,
+                                                trial_num=trial_num)
+        else:
+            if prefetcher is not None:
+                combined_tone = prefetcher.pop()
+            else:
+                combined_tone = self.render_trial(trial, intensity_change_db)
+            timer.mark()  # synthesis
+            duration = self.play_after_fixation(timer, combined_tone)
+
+        # Collect user response
+        keys = self.collect_response(timer, duration)
+        user_response = 'yes' if 'y' in keys[0][0] else 'no'
+        response_time = round(keys[0][1], 3)
+        correct_answer = 'yes' if has_high_intensity else 'no'
+        correct = 1 if user_response == correct_answer else 0
+        periodic = 1 if periodic==True else 0
+        hasManip = 1 if has_high_intensity else 0
+
+        # Save response data if not in practice mode
+        if not practice:
+            self.results_writer.write([self.participant_number, periodic, chosen_IOI, hasManip, trial_num, high_intensity_index, user_response, correct_answer, correct, response_time])
+            if self.event_log is not None:
+                self.event_log.trial(trial_num, periodic, chosen_IOI, hasManip, high_intensity_index, intensity_change_db,
+                                     user_response == 'yes', correct, response_time)
+
+        return user_response, correct_answer, correct, response_time
+
+    # Present one adaptive trial at the given intensity change and record the response
+    def present_adaptive_trial(self, trial_num, intensity_change_db):
+        intervals = [ADAPTIVE_INTERVAL] * SEQ_LEN  # Set consistent intervals between tones for simplicity
+
+        # Randomly choose one tone to have higher intensity
+        high_intensity_index = random.randint(1, SEQ_LEN - 2)
+        timer = self.timing_log.start('adaptive', trial_num)
+        if self.audio_output == 'stream':
+            tones = sequence_tones(high_intensity_index, intensity_change_db)
+            onsets, length = sequence_onsets([len(tone) for tone in tones], intervals, SAMPLE_RATE)
+            timer.mark()
+            duration = self.play_after_fixation(timer, tones=tones, onsets=onsets, length=length, kind='adaptive',
+                                                trial_num=trial_num)
+        else:
+            combined_tone = self.synthesize_sequence(intervals, high_intensity_index, intensity_change_db)
+            timer.mark()
+            duration = self.play_after_fixation(timer, combined_tone)
+
+        # Collect user response
+        keys = self.collect_response(timer, duration)
+        user_response = 'yes' if 'y' in keys[0][0] else 'no'
+        correct_answer = 'yes'
+        correct = 1 if user_response == correct_answer else 0
+
+        # Store adaptive tracking data
+        self.adaptive_tracking_data.append([trial_num, intensity_change_db, user_response, correct])
+        self.adaptive_writer.write(self.adaptive_tracking_data[-1])
+        if self.event_log is not None:
+            self.event_log.adaptive(trial_num, ADAPTIVE_INTERVAL, high_intensity_index, intensity_change_db,
+                                    user_response == 'yes', correct)
+        return user_response, correct
+
+    # Run practice trials with adaptive intensity adjustment
+    def run_adaptive_practice(self):
+        # Save adaptive tracking data as it is collected
+        adaptive_tracking_filename = os.path.join(self.data_dir, f"adaptive_tracking_{self.participant_number}_{self.today}.csv")
+        self.adaptive_writer = ResultWriter(adaptive_tracking_filename, header=ADAPTIVE_COLUMNS)
+
+        self.screens.show('practice_instructions', PRACTICE_INSTRUCTIONS_TEXT, wrapWidth=1.5)
+        self.backend.event.waitKeys(keyList=['space'])
+
+        if self.adaptive_engine == 'psi':
+            current_intensity_change_db = self.run_psi_tracking()
+        else:
+            current_intensity_change_db = self.run_staircase_tracking()
+
+        end_practice_text = f"""Practice phase complete.\n\n
+    Your 70% threshold intensity change is {current_intensity_change_db:.2f} dB.\n
+    Press the space bar to begin the main experiment."""
+        end_practice = self.backend.visual.TextStim(self.win, text=end_practice_text, pos=(0, 0), wrapWidth=1.5)
+        end_practice.draw()
+        self.win.flip()
+        self.backend.event.waitKeys(keyList=['space'])
+
+        self.adaptive_writer.close()
+
+        return current_intensity_change_db
+
+    # Track the threshold with three blocks of the 2-down/1-up staircase
+    def run_staircase_tracking(self):
+        from tqdm import tqdm
+
+        staircase = Staircase()
+        block_estimates = []
+        for block in range(ADAPTIVE_TRACKING_BLOCKS):
+            if block > 0:
+                self.screens.show('next_block', NEXT_BLOCK_TEXT, wrapWidth=1.5)
+                self.backend.event.waitKeys(keyList=['space'])
+            for trial_num in tqdm(range(ADAPTIVE_TRIALS), desc=f"Adaptive Tracking Block {block + 1}"):
+                user_response, correct = self.present_adaptive_trial(trial_num, staircase.level)
+                estimate = staircase.update(correct)
+            block_estimates.append(estimate)
+
+        return sum(block_estimates) / len(block_estimates)
+
+    # Track the threshold with the Bayesian Psi method, stopping once the posterior is tight
+    def run_psi_tracking(self):
+        from tqdm import tqdm
+        from psi import PsiEstimator
+
+        # The default levels are the staircase's, see staircase_sim.LEVELS
+        psi = PsiEstimator(max_trials=ADAPTIVE_TRIALS * ADAPTIVE_TRACKING_BLOCKS)
+        progress = tqdm(total=psi.max_trials, desc="Adaptive Tracking (Psi)")
+        trial_num = 0
+        while not psi.done():
+            intensity_change_db = psi.next_level()
+            user_response, correct = self.present_adaptive_trial(trial_num, intensity_change_db)
+            psi.update(intensity_change_db, user_response == 'yes')
+            trial_num += 1
+            progress.update(1)
+        progress.close()
+        return psi.estimate()
+
+    # Run the whole session: instructions, adaptive practice and the main blocks
+    def run(self):
+        from tqdm import tqdm
+
+        self.show_instructions()
+        trial_data, structure_number, bank = self.load_trial_structure()
+        filename = os.path.join(self.data_dir, f"JUDIT_{self.participant_number}_{structure_number}_{self.today}.csv")
+        TRIALS_PER_BLOCK = len(trial_data) // NUM_BLOCKS
+        block_num = 0
+        block_trials = trial_data[:TRIALS_PER_BLOCK]
+        self.timing_log = TimingLog(FIXATION_TIME, os.path.join(self.data_dir, f"timing_{self.participant_number}_{structure_number}_{self.today}.csv"),
+                                    enabled=self.record_timing,
+                                    session_clock=self.backend.core.getTime if self.backend.headless else None)
+        self.results_writer = ResultWriter(filename, header=RESULT_COLUMNS)
+        self.event_log = EventLog(self.data_dir, self.participant_number, structure_number, date=self.today,
+                                  task='JUDIT_task_modified', level_unit='dB')
+        if self.audio_output == 'stream':
+            self.tone_stream = self.open_tone_stream()
+            self.onset_writer = ResultWriter(os.path.join(self.data_dir, f"stream_onsets_{self.participant_number}_{structure_number}_{self.today}.csv"),
+                                             header=STREAM_ONSET_COLUMNS)
+        if not self.skip_practice:
+            adaptive_intensity_change_db = self.run_adaptive_practice()
+        else:
+            adaptive_intensity_change_db = INITIAL_INTENSITY_CHANGE_DB
+
+        # Render a block's audio on a worker thread so run_trial only has to pop a ready buffer
+        def prefetch_block(block_trials):
+            if self.audio_output == 'stream':
+                return None
+            render = lambda trial: self.render_trial(trial, intensity_change_db=adaptive_intensity_change_db, bank=bank)
+            return BlockPrefetcher(render, block_trials, depth=PREFETCH_DEPTH)
+
+        # Lay out every break screen before the first trial so block transitions only draw
+        break_texts = {('break', block): f"Block {block} complete. Take a short break.\nPress the space bar to continue."
+                       for block in range(1, NUM_BLOCKS)}
+        self.screens.prebuild(break_texts, wrapWidth=1.5)
+
+        prefetch_wait_times = []
+        prefetcher = prefetch_block(block_trials)
+        try:
+            for trial in tqdm(block_trials, desc=f"Block {block_num + 1} Trials"):
+                self.run_trial(trial, intensity_change_db=adaptive_intensity_change_db, prefetcher=prefetcher)
+            if prefetcher is not None:
+                prefetch_wait_times.extend(prefetcher.wait_times)
+            block_num += 1
+            while block_num < NUM_BLOCKS:
+                block_trials = trial_data[block_num * TRIALS_PER_BLOCK: (block_num + 1) * TRIALS_PER_BLOCK]
+                # Start rendering the next block while the break screen is up
+                prefetcher = prefetch_block(block_trials)
+                self.screens.show(('break', block_num), break_texts[('break', block_num)])
+                self.backend.event.waitKeys(keyList=['space'])
+                for trial in tqdm(block_trials, desc=f"Block {block_num + 1} Trials"):
+                    self.run_trial(trial, intensity_change_db=adaptive_intensity_change_db, prefetcher=prefetcher)
+                if prefetcher is not None:
+                    prefetch_wait_times.extend(prefetcher.wait_times)
+                block_num += 1
+        finally:
+            if prefetcher is not None:
+                prefetcher.close()
+            if self.tone_stream is not None:
+                self.tone_stream.close()
+            close_all()
+            self.event_log.close()
+            self.mouse.setVisible(True)
+            self.win.close()
+            if prefetch_wait_times:
+                waits_ms = np.array(prefetch_wait_times) * 1000
+                print(f"Prefetch wait before onset: median {np.median(waits_ms):.3f} ms, max {waits_ms.max():.3f} ms")
+            print(f"Stimulus cache: {self.stimulus_cache.stats()}")
+            print(f"Audio format: {AUDIO_FORMAT.describe(generate_tone(BASE_FREQ, DURATION, SAMPLE_RATE, INTENSITY_NORMAL_DB))}")
+            errors_ms = np.array([error for error in self.stream_onset_errors if error is not None]) * 1000
+            if len(errors_ms):
+                print(f"Streamed inter-onset error: median {np.median(errors_ms):.3f} ms, max {errors_ms.max():.3f} ms")
+            if self.record_timing:
+                print(self.timing_log.summary())
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import math
+import os
+import re
+
+# Manifest recording how every generated trial list was built
+MANIFEST_PATH = "trialList/manifest.json"
+AUDIO_PARAMS = ('SAMPLE_RATE', 'AUDIO_FORMAT')  # only matter to the stimulus bank; the CSV/.npz are rate-free
+
+# SHA-256 of a file, read in chunks so large stimulus banks stay out of memory
+def file_checksum(path, chunk_size=2**20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Size and modification time of a file, as a cheap stand-in for its checksum
+def file_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+# Generation parameters that affect the outputs: the audio format only matters when a bank is written
+def output_params(params, write_stimulus_bank):
+    if write_stimulus_bank:
+        return params
+    return {name: value for name, value in params.items() if name not in AUDIO_PARAMS}
+
+# Stable hash of the generation parameters
+def parameter_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# Whether a trial list has to be regenerated for these parameters and seed
+def needs_rebuild(manifest, trial_list_filename, params, seed):
+    entry = manifest.get(os.path.basename(trial_list_filename))
+    if entry is None or entry['params_hash'] != parameter_hash(params) or entry['seed'] != seed:
+        return True
+    directory = os.path.dirname(trial_list_filename)
+    for name, checksum in entry['outputs'].items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path) or file_checksum(path) != checksum:
+            return True
+    return False
+
+# Record the parameters, seed and output checksums of a freshly generated trial list
+def record_outputs(manifest, trial_list_filename, params, seed, output_paths):
+    manifest[os.path.basename(trial_list_filename)] = {
+        'params': params,
+        'params_hash': parameter_hash(params),
+        'seed': seed,
+        'outputs': {os.path.basename(path): file_checksum(path) for path in output_paths if os.path.exists(path)},
+        'stats': {os.path.basename(path): file_stat(path) for path in output_paths if os.path.exists(path)},
+    }
+
+# Refuse to run a session on a trial list that no longer matches its manifest entry
+def verify_trial_list(trial_list_filename, expected_params, manifest_path=MANIFEST_PATH):
+    """
+    `expected_params` are the task's own values for parameters the generator also
+    recorded (e.g. DURATION); each must match. AUDIO_PARAMS are only compared when a
+    stimulus bank was generated, so lists without one work at any sample rate. Every
+    output recorded for the trial list must be unchanged: its size and modification
+    time are checked, and only a file whose stat differs is hashed. Trial lists
+    without a manifest entry (generated before manifests existed) are accepted.
+    Raises ValueError when the list is stale.
+    """
+    entry = load_manifest(manifest_path).get(os.path.basename(trial_list_filename))
+    if entry is None:
+        return False
+    has_bank = entry['params'].get('write_stimulus_bank', False)
+    for name, expected in expected_params.items():
+        if name in AUDIO_PARAMS and not has_bank:
+            continue
+        recorded = entry['params'].get(name)
+        if isinstance(expected, float) and isinstance(recorded, (int, float)):
+            matches = math.isclose(recorded, expected, rel_tol=1e-9)
+        else:
+            matches = recorded == expected
+        if not matches:
+            raise ValueError(f"{trial_list_filename} was generated with {name}={recorded!r}, task expects {expected!r}; regenerate the trial lists")
+    directory = os.path.dirname(trial_list_filename)
+    stats = entry.get('stats', {})
+    for name, checksum in entry['outputs'].items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            raise ValueError(f"{path} does not match the manifest; regenerate the trial lists")
+        if file_stat(path) != stats.get(name) and file_checksum(path) != checksum:
+            raise ValueError(f"{path} does not match the manifest; regenerate the trial lists")
+    return True
+
+# Trial lists in a directory that a task may choose from
+def candidate_trial_lists(directory, pattern, generator, manifest_path=MANIFEST_PATH):
+    """
+    Keeps the files whose whole name matches the regular expression `pattern` and,
+    when they have a manifest entry, were written by `generator` (e.g. 'gen.py').
+    This keeps gen.py's JUDIT_<n>.csv and JUDIT_gen_trials.py's JUDIT_<condition>_<n>.csv
+    apart when both live in trialList/. Raises ValueError when nothing is left.
+    """
+    manifest = load_manifest(manifest_path)
+    names = sorted(name for name in os.listdir(directory) if re.fullmatch(pattern, name)
+                   and manifest.get(name, {}).get('params', {}).get('generator', generator) == generator)
+    if not names:
+        raise ValueError(f"No trial lists matching {pattern} from {generator} in {directory}; run {generator} first")
+    return names
@@ -0,0 +1,47 @@
+import queue
+import threading
+import time
+
+# Render trial audio on a worker thread ahead of the trial loop
+class BlockPrefetcher:
+    """
+    Calls `render(item)` for each item in order on a background thread and hands the
+    results back through pop(). `depth` bounds how many rendered trials are held at
+    once; None renders the whole block ahead. Time spent blocked in pop() is kept in
+    `wait_times` so onset latency can be checked across the session.
+    """
+
+    def __init__(self, render, items, depth=None):
+        self._queue = queue.Queue(maxsize=depth or 0)
+        self._stop = threading.Event()
+        self.wait_times = []
+        self._thread = threading.Thread(target=self._work, args=(render, list(items)), daemon=True)
+        self._thread.start()
+
+    def _work(self, render, items):
+        for item in items:
+            if self._stop.is_set():
+                return
+            try:
+                result = (render(item), None)
+            except Exception as error:
+                result = (None, error)
+            self._queue.put(result)
+
+    # Return the next rendered buffer, waiting only if the worker has fallen behind
+    def pop(self):
+        start = time.perf_counter()
+        buffer, error = self._queue.get()
+        self.wait_times.append(time.perf_counter() - start)
+        if error is not None:
+            raise error
+        return buffer
+
+    # Stop rendering and release any buffers that were not consumed
+    def close(self):
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.01)
+            except queue.Empty:
+                pass
@@ -0,0 +1,79 @@
+import numpy as np
+from staircase_sim import LEVELS, target_level
+
+# Bayesian adaptive threshold estimation (Psi method) on a threshold x slope grid
+class PsiEstimator:
+    """
+    Keeps a posterior over the threshold and slope of the same logistic model as
+    staircase_sim.p_yes. The likelihood of a "yes" at every candidate level is
+    tabulated once, so each trial costs one multiply over the grid plus a vectorized
+    expected-entropy pass over the candidate levels. The next level is the one with
+    the lowest expected posterior entropy.
+    """
+
+    def __init__(self, levels=None, thresholds=None, slopes=None, false_alarm_rate=0.1, lapse_rate=0.02,
+                 target=1 / np.sqrt(2), stop_sd_db=0.25, min_trials=20, max_trials=108):
+        self.levels = LEVELS if levels is None else np.asarray(levels, dtype=np.float64)
+        self.thresholds = np.linspace(0.0, 6.0, 61) if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+        self.slopes = np.geomspace(0.1, 2.0, 15) if slopes is None else np.asarray(slopes, dtype=np.float64)
+        self.false_alarm_rate = false_alarm_rate
+        self.lapse_rate = lapse_rate
+        self.target = target
+        self.stop_sd_db = stop_sd_db
+        self.min_trials = min_trials
+        self.max_trials = max_trials
+
+        # Likelihood of "yes" for every (level, threshold, slope), computed once
+        level = self.levels[:, None, None]
+        threshold = self.thresholds[None, :, None]
+        slope = self.slopes[None, None, :]
+        detect = 1 / (1 + np.exp(-(level - threshold) / slope))
+        self.p_yes = false_alarm_rate + (1 - false_alarm_rate - lapse_rate) * detect
+        self.p_no = 1 - self.p_yes
+        self.log_p_yes = np.log(self.p_yes)
+        self.log_p_no = np.log(self.p_no)
+
+        self.posterior = np.full((len(self.thresholds), len(self.slopes)), 1 / (len(self.thresholds) * len(self.slopes)))
+        self.trials = 0
+
+    # Level (in dB) with the greatest expected information gain for the next trial
+    def next_level(self):
+        # With joint = p(r | level, params) * posterior and P(r) = sum(joint), the entropy of the
+        # updated posterior is log P(r) - sum(joint * log joint) / P(r); weighting by P(r) gives
+        # the expected entropy without normalizing a full posterior per candidate level
+        log_posterior = np.log(np.maximum(self.posterior, 1e-300))
+        joint_yes = self.p_yes * self.posterior
+        joint_no = self.p_no * self.posterior
+        prob_yes = joint_yes.sum(axis=(1, 2))
+        prob_no = 1 - prob_yes
+        plogp_yes = (joint_yes * (self.log_p_yes + log_posterior)).sum(axis=(1, 2))
+        plogp_no = (joint_no * (self.log_p_no + log_posterior)).sum(axis=(1, 2))
+        expected_entropy = prob_yes * np.log(prob_yes) + prob_no * np.log(prob_no) - plogp_yes - plogp_no
+        return float(self.levels[np.argmin(expected_entropy)])
+
+    # Fold in the response to a trial presented at `level`
+    def update(self, level, said_yes):
+        index = int(np.argmin(np.abs(self.levels - level)))
+        self.posterior *= self.p_yes[index] if said_yes else self.p_no[index]
+        self.posterior /= self.posterior.sum()
+        self.trials += 1
+
+    # Posterior mean and SD of the threshold parameter
+    def threshold_stats(self):
+        marginal = self.posterior.sum(axis=1)
+        mean = float((marginal * self.thresholds).sum())
+        sd = float(np.sqrt((marginal * (self.thresholds - mean) ** 2).sum()))
+        return mean, sd
+
+    # Intensity change at the target P(yes) under the posterior mean threshold and slope
+    def estimate(self):
+        threshold, _ = self.threshold_stats()
+        slope = float((self.posterior.sum(axis=0) * self.slopes).sum())
+        level = target_level(threshold, slope, self.target, self.false_alarm_rate, self.lapse_rate)
+        return float(np.clip(level, self.levels[0], self.levels[-1]))
+
+    # Stop once the threshold posterior is tight enough, or the trial budget is used up
+    def done(self):
+        if self.trials >= self.max_trials:
+            return True
+        return self.trials >= self.min_trials and self.threshold_stats()[1] <= self.stop_sd_db
@@ -0,0 +1,122 @@
+import itertools
+
+# The four trial types as (periodic, has_high_intensity)
+TRIAL_TYPES = [(True, True), (True, False), (False, True), (False, False)]
+
+# Longest run of equal values in a sequence
+def longest_run(values):
+    return max((len(list(group)) for _, group in itertools.groupby(values)), default=0)
+
+# Run state after appending a trial type: (last type, its run, last factor values, their runs)
+def _advance(state, trial_type):
+    last_type, type_run, last_factors, factor_runs = state
+    type_run = type_run + 1 if trial_type == last_type else 1
+    factor_runs = tuple(run + 1 if value == last else 1
+                        for value, last, run in zip(trial_type, last_factors, factor_runs))
+    return trial_type, type_run, trial_type, factor_runs
+
+# Order trial types so no run is too long, building the order directly instead of reshuffling
+def _order_block(counts, rng, max_run, max_factor_run, state):
+    """
+    Depth-first search choosing each next type at random among those that keep every
+    run within its limit. A type is only tried if the remaining trials can still be
+    arranged (the most frequent remaining type can be separated by the others), so
+    the search practically never has to backtrack. `state` carries the runs from the
+    previous block, so limits also hold across block boundaries.
+    Returns the order and the run state at its end.
+    """
+    counts = dict(counts)
+    order = []
+    states = [state]
+    total = sum(counts.values())
+
+    def allowed(trial_type):
+        if counts[trial_type] == 0:
+            return False
+        _, type_run, _, factor_runs = _advance(states[-1], trial_type)
+        if type_run > max_run or max(factor_runs) > max_factor_run:
+            return False
+        # The most frequent type left must still fit between the other remaining trials
+        left = [count - (other == trial_type) for other, count in counts.items()]
+        largest = max(left)
+        return largest <= max_run * (sum(left) - largest + 1)
+
+    def extend():
+        if len(order) == total:
+            return True
+        candidates = [trial_type for trial_type in TRIAL_TYPES if allowed(trial_type)]
+        for j in rng.permutation(len(candidates)):
+            trial_type = candidates[j]
+            counts[trial_type] -= 1
+            order.append(trial_type)
+            states.append(_advance(states[-1], trial_type))
+            if extend():
+                return True
+            states.pop()
+            order.pop()
+            counts[trial_type] += 1
+        return False
+
+    if not extend():
+        raise ValueError(f"No order satisfies max_run={max_run}, max_factor_run={max_factor_run}")
+    return order, states[-1]
+
+# Build one randomized trial structure that satisfies the balance and run constraints
+def balanced_structure(rng, trials=192, num_blocks=6, manip_pos=(11, 12, 13, 14), iois=(0.2, 0.25),
+                       max_run=3, max_factor_run=4):
+    """
+    Every block gets an equal share of each trial type, each target position among its
+    louder-tone trials and each IOI among its periodic trials; these are assigned by
+    permutation so balance holds by construction. Within and across blocks no trial
+    type repeats more than `max_run` times in a row and neither periodicity nor
+    presence of the louder tone repeats more than `max_factor_run` times.
+    Returns a list of dicts with periodic, has_high_intensity, high_intensity_index
+    and chosen_IOI.
+    """
+    block_size = trials // num_blocks
+    per_type = block_size // len(TRIAL_TYPES)
+    if trials % num_blocks or block_size % len(TRIAL_TYPES):
+        raise ValueError(f"{trials} trials cannot be split into {num_blocks} blocks of balanced trial types")
+    targets = 2 * per_type
+    periodic = 2 * per_type
+    if targets % len(manip_pos) or periodic % len(iois):
+        raise ValueError(f"A block of {block_size} trials cannot balance {len(manip_pos)} positions and {len(iois)} IOIs")
+
+    structure = []
+    state = (None, 0, (None, None), (0, 0))
+    for _ in range(num_blocks):
+        order, state = _order_block({trial_type: per_type for trial_type in TRIAL_TYPES}, rng, max_run, max_factor_run, state)
+        positions = [manip_pos[j % len(manip_pos)] for j in rng.permutation(targets)]
+        block_iois = [iois[j % len(iois)] for j in rng.permutation(periodic)]
+        for is_periodic, has_high_intensity in order:
+            structure.append({
+                'periodic': is_periodic,
+                'has_high_intensity': has_high_intensity,
+                'high_intensity_index': int(positions.pop()) if has_high_intensity else None,
+                'chosen_IOI': float(block_iois.pop()) if is_periodic else None,
+            })
+    return structure
+
+# List the constraints a structure breaks (empty when it is valid)
+def violations(structure, num_blocks=6, manip_pos=(11, 12, 13, 14), iois=(0.2, 0.25), max_run=3, max_factor_run=4):
+    problems = []
+    types = [(trial['periodic'], trial['has_high_intensity']) for trial in structure]
+    if longest_run(types) > max_run:
+        problems.append(f"trial type repeats {longest_run(types)} times in a row")
+    for factor, name in enumerate(['periodic', 'has_high_intensity']):
+        run = longest_run([trial_type[factor] for trial_type in types])
+        if run > max_factor_run:
+            problems.append(f"{name} repeats {run} times in a row")
+    block_size = len(structure) // num_blocks
+    for block in range(num_blocks):
+        trials = structure[block * block_size:(block + 1) * block_size]
+        positions = [trial['high_intensity_index'] for trial in trials if trial['has_high_intensity']]
+        if len({positions.count(pos) for pos in manip_pos}) > 1:
+            problems.append(f"block {block + 1} has unbalanced target positions")
+        block_iois = [trial['chosen_IOI'] for trial in trials if trial['periodic']]
+        if len({block_iois.count(ioi) for ioi in iois}) > 1:
+            problems.append(f"block {block + 1} has unbalanced IOIs")
+        block_types = [(trial['periodic'], trial['has_high_intensity']) for trial in trials]
+        if len({block_types.count(trial_type) for trial_type in TRIAL_TYPES}) > 1:
+            problems.append(f"block {block + 1} has unbalanced trial types")
+    return problems
@@ -0,0 +1,107 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+# Writers that still have to be flushed when the session ends
+_open_writers = []
+_open_writers_lock = threading.Lock()
+
+# Append rows to a CSV file from a background thread
+class ResultWriter:
+    """
+    Keeps a single handle open for the whole session. write() only queues the row;
+    the writer thread collects rows for `sync_interval` seconds after the first one
+    arrives and then writes and fsyncs them as one batch, so a crash loses at most
+    that much data. flush() and close() (also run at interpreter exit) end the
+    current batch at once and write everything queued before returning.
+    """
+
+    def __init__(self, filename, header=None, mode='w', sync_interval=1.0):
+        self.filename = filename
+        self.sync_interval = sync_interval
+        self._file = open(filename, mode, newline='')
+        self._writer = csv.writer(self._file)
+        if header is not None:
+            self._writer.writerow(header)
+        self._queue = queue.Queue()
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+        with _open_writers_lock:
+            _open_writers.append(self)
+
+    def _work(self):
+        done = False
+        while not done:
+            # Sleep until something is queued, then gather the batch until it is due
+            rows = [self._queue.get()]
+            deadline = time.monotonic() + self.sync_interval
+            while isinstance(rows[-1], list):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            done = rows[-1] is None
+            try:
+                for row in rows:
+                    if isinstance(row, list):
+                        self._writer.writerow(row)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except Exception as error:
+                self._error = error
+            if isinstance(rows[-1], threading.Event):
+                rows[-1].set()
+
+    # Queue one row for writing
+    def write(self, row):
+        if self._closed:
+            raise ValueError(f"Result file {self.filename} is already closed")
+        if self._error is not None:
+            raise self._error
+        self._queue.put(list(row))
+
+    # Block until every queued row is written and synced to disk
+    def flush(self):
+        if self._closed:
+            return
+        synced = threading.Event()
+        self._queue.put(synced)
+        synced.wait()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        with _open_writers_lock:
+            if self in _open_writers:
+                _open_writers.remove(self)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Close every open writer; call before core.quit() so no queued rows are lost
+def close_all():
+    with _open_writers_lock:
+        writers = list(_open_writers)
+    for writer in writers:
+        writer.close()
+
+atexit.register(close_all)
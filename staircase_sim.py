@@ -0,0 +1,95 @@
+import itertools
+import time
+import numpy as np
+import judit_engine
+
+# Staircase parameters, taken from judit_engine so the simulation and the fits follow the task
+INITIAL_DB = judit_engine.INITIAL_INTENSITY_CHANGE_DB
+MIN_DB = judit_engine.MIN_INTENSITY_CHANGE_DB
+MAX_DB = judit_engine.MAX_INTENSITY_CHANGE_DB
+STEP_DB = judit_engine.STEP_SIZE_DB
+TRIALS_PER_BLOCK = judit_engine.ADAPTIVE_TRIALS
+NUM_BLOCKS = judit_engine.ADAPTIVE_TRACKING_BLOCKS
+LEVELS = np.arange(MIN_DB, MAX_DB + STEP_DB / 2, STEP_DB)  # intensity changes the staircase can present (dB)
+
+# Probability of a "yes" response at each intensity change (logistic with guessing and lapses)
+def p_yes(levels, threshold_db, slope_db, false_alarm_rate=0.1, lapse_rate=0.02):
+    detect = 1 / (1 + np.exp(-(levels - threshold_db) / slope_db))
+    return false_alarm_rate + (1 - false_alarm_rate - lapse_rate) * detect
+
+# Intensity change at which P(yes) reaches `target` (70.7% for a 2-down/1-up rule)
+def target_level(threshold_db, slope_db, target=1 / np.sqrt(2), false_alarm_rate=0.1, lapse_rate=0.02):
+    detect = (target - false_alarm_rate) / (1 - false_alarm_rate - lapse_rate)
+    return threshold_db + slope_db * np.log(detect / (1 - detect))
+
+# Run the 2-down/1-up staircase for many simulated observers at once
+def simulate(threshold_db, slope_db=0.5, false_alarm_rate=0.1, lapse_rate=0.02, initial_db=INITIAL_DB,
+             min_db=MIN_DB, max_db=MAX_DB, step_db=STEP_DB, trials_per_block=TRIALS_PER_BLOCK,
+             num_blocks=NUM_BLOCKS, seed=None):
+    """
+    `threshold_db` is an array with one true threshold per observer. Follows run_adaptive_trial
+    exactly: every trial has a louder tone, two consecutive correct answers lower the level,
+    one error raises it, the level and counters carry over between blocks, each block's
+    estimate is the mean of the last three levels and the final estimate averages the blocks.
+    Returns (final estimates, per-block estimates of shape (observers, blocks)).
+    """
+    rng = np.random.default_rng(seed)
+    threshold_db = np.asarray(threshold_db, dtype=np.float64)
+    n = threshold_db.shape[0]
+    level = np.full(n, float(initial_db))
+    correct_run = np.zeros(n, dtype=np.int8)
+    last_three = np.empty((n, 3))
+    block_estimates = np.empty((n, num_blocks))
+
+    trial = 0
+    for block in range(num_blocks):
+        for _ in range(trials_per_block):
+            correct = rng.random(n) < p_yes(level, threshold_db, slope_db, false_alarm_rate, lapse_rate)
+            correct_run = np.where(correct, correct_run + 1, 0)
+            step_down = correct_run >= 2
+            level = np.where(step_down, np.maximum(min_db, level - step_db), level)
+            level = np.where(correct, level, np.minimum(max_db, level + step_db))
+            correct_run[step_down] = 0
+            last_three[:, trial % 3] = level
+            trial += 1
+        # Mean of the levels recorded so far, up to the last three
+        block_estimates[:, block] = last_three[:, :min(trial, 3)].mean(axis=1)
+    return block_estimates.mean(axis=1), block_estimates
+
+# Bias, spread and error of staircase estimates against the 70.7% point of each observer
+def summarize(estimates, threshold_db, slope_db=0.5, false_alarm_rate=0.1, lapse_rate=0.02):
+    truth = target_level(np.asarray(threshold_db), slope_db, false_alarm_rate=false_alarm_rate, lapse_rate=lapse_rate)
+    error = estimates - truth
+    return {
+        'bias_db': float(error.mean()),
+        'sd_db': float(error.std()),
+        'rmse_db': float(np.sqrt((error ** 2).mean())),
+        'p5_error_db': float(np.percentile(error, 5)),
+        'p95_error_db': float(np.percentile(error, 95)),
+    }
+
+# Characterize the staircase over a grid of step sizes, trial counts and block counts
+def sweep(step_sizes=(0.0625, 0.125, 0.25, 0.5), trial_counts=(24, 36, 48), block_counts=(1, 2, 3),
+          n_observers=20000, threshold_range=(0.5, 4.0), slope_db=0.5, seed=0):
+    """
+    True thresholds are drawn uniformly from `threshold_range`; the same observers are reused
+    for every grid point so settings are compared on equal footing.
+    """
+    rng = np.random.default_rng(seed)
+    thresholds = rng.uniform(*threshold_range, size=n_observers)
+    rows = []
+    for i, (step_db, trials, blocks) in enumerate(itertools.product(step_sizes, trial_counts, block_counts)):
+        estimates, _ = simulate(thresholds, slope_db=slope_db, step_db=step_db, trials_per_block=trials,
+                                num_blocks=blocks, seed=seed + i + 1)
+        rows.append({'step_db': step_db, 'trials_per_block': trials, 'num_blocks': blocks,
+                     **summarize(estimates, thresholds, slope_db)})
+    return rows
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    rows = sweep()
+    print(f"{'step':>7} {'trials':>6} {'blocks':>6} {'bias':>7} {'sd':>7} {'rmse':>7}")
+    for row in rows:
+        print(f"{row['step_db']:>7.4f} {row['trials_per_block']:>6} {row['num_blocks']:>6} "
+              f"{row['bias_db']:>7.3f} {row['sd_db']:>7.3f} {row['rmse_db']:>7.3f}")
+    print(f"Swept {len(rows)} settings in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+from audio_format import AudioFormat
+from trial_lists import save_npz
+
+# Paths of the bank files that sit next to a trial list CSV
+def bank_paths(trial_list_filename):
+    stem = os.path.splitext(trial_list_filename)[0]
+    return f"{stem}_bank.npy", f"{stem}_bank_index.npz"
+
+# Check whether a stimulus bank was generated for a trial list
+def has_bank(trial_list_filename):
+    return all(os.path.exists(path) for path in bank_paths(trial_list_filename))
+
+# Write every trial's audio into one contiguous file plus an offset index
+def write_bank(trial_list_filename, buffers, onsets, sample_rate, amplitude, audio_format=None, frequency=None,
+               duration=None, lengths=None):
+    """
+    `buffers` are the rendered trial sequences in trial order and `onsets` the tone onset
+    samples for each of them. `amplitude` is the normal tone amplitude the audio was rendered at,
+    and `frequency` and `duration` (recorded in the index when given) the tone it was built from.
+    The audio is stored in `audio_format` (float32 by default). When the samples per trial are
+    given as `lengths`, `buffers` may be a generator: each buffer is then rendered, written into
+    the memory map and dropped before the next one, so only one trial is ever in memory.
+    """
+    audio_format = audio_format or AudioFormat(sample_rate)
+    audio_path, index_path = bank_paths(trial_list_filename)
+    if lengths is None:
+        buffers = list(buffers)
+        lengths = [len(buffer) for buffer in buffers]
+    lengths = np.asarray(lengths, dtype=np.int64)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)[:-1]
+
+    audio = np.lib.format.open_memmap(audio_path, mode='w+', dtype=audio_format.dtype, shape=(int(lengths.sum()),))
+    for buffer, offset, length in zip(buffers, offsets, lengths):
+        if len(buffer) != length:
+            raise ValueError(f"Trial buffer has {len(buffer)} samples, expected {length}")
+        audio[offset:offset + length] = audio_format.encode(buffer)
+    audio.flush()
+    del audio
+
+    tone = {name: value for name, value in (('frequency', frequency), ('duration', duration)) if value is not None}
+    save_npz(index_path, offsets=offsets, lengths=lengths, onsets=np.array(onsets, dtype=np.int64),
+             sample_rate=sample_rate, amplitude=amplitude, headroom_db=audio_format.headroom_db, **tone)
+
+# Memory-mapped view of a generated stimulus bank
+class StimulusBank:
+    """
+    Indexing returns the stored samples (float32 or int16); `format.decode` turns
+    them into float32 for playback. `frequency` and `duration` describe the tone the
+    audio was built from, and are None for banks written before they were recorded.
+    """
+
+    def __init__(self, trial_list_filename):
+        audio_path, index_path = bank_paths(trial_list_filename)
+        self.audio = np.load(audio_path, mmap_mode='r')
+        with np.load(index_path) as index:
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.onsets = index['onsets']
+            self.sample_rate = int(index['sample_rate'])
+            self.amplitude = float(index['amplitude'])
+            headroom_db = float(index['headroom_db']) if 'headroom_db' in index.files else 0.0
+            self.frequency = float(index['frequency']) if 'frequency' in index.files else None
+            self.duration = float(index['duration']) if 'duration' in index.files else None
+        self.format = AudioFormat(self.sample_rate, self.audio.dtype.name, headroom_db)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    # Zero-copy, read-only slice holding the exact samples of one trial
+    def __getitem__(self, trial_num):
+        offset = self.offsets[trial_num]
+        return self.audio[offset:offset + self.lengths[trial_num]]
+
+# Open the bank for a trial list, or return None if it was never generated
+def load_bank(trial_list_filename, sample_rate=None):
+    if not has_bank(trial_list_filename):
+        return None
+    bank = StimulusBank(trial_list_filename)
+    if sample_rate is not None and bank.sample_rate != sample_rate:
+        raise ValueError(f"Stimulus bank for {trial_list_filename} was rendered at {bank.sample_rate} Hz, expected {sample_rate} Hz")
+    return bank
@@ -0,0 +1,66 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Content hash of everything that determines a trial's audio
+def stimulus_key(intervals, high_intensity_index, intensity_change_db, sample_rate):
+    """
+    Pass None for the index and dB change when no tone is louder, so that all
+    trials with the same intervals share one entry.
+    """
+    content = (tuple(float(interval) for interval in intervals), high_intensity_index,
+               None if intensity_change_db is None else float(intensity_change_db), int(sample_rate))
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+# LRU cache of rendered trial audio bounded by total buffer size
+class StimulusCache:
+    """
+    Cached buffers are shared between trials and marked read-only. Only audio that
+    can recur (periodic and adaptive sequences) is worth caching.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Return the buffer for `key`, calling `render()` to build it on a miss
+    def get(self, key, render):
+        with self._lock:
+            buffer = self._entries.get(key)
+            if buffer is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return buffer
+            self.misses += 1
+
+        buffer = render()
+        buffer.setflags(write=False)
+        with self._lock:
+            if key not in self._entries and buffer.nbytes <= self.max_bytes:
+                self._entries[key] = buffer
+                self.nbytes += buffer.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+                    self.evictions += 1
+        return buffer
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    # One-line summary of the hit/miss counters
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f"{self.hits} hits, {self.misses} misses ({hit_rate:.1%} hit rate), "
+                f"{self.evictions} evictions, {len(self._entries)} entries using {self.nbytes / 2**20:.1f} MB")
@@ -0,0 +1,54 @@
+# Reuses a few Sound objects across trials, refilling their buffers in place
+class SoundPool:
+    """
+    Sounds are handed out round-robin, so the one acquired for a trial is never the
+    one the previous trial is still stopping. The first `size` acquisitions build the
+    Sounds; later ones only call setSound() with the new samples.
+    """
+
+    def __init__(self, sound_class, sample_rate, size=2):
+        self.sound_class = sound_class
+        self.sample_rate = sample_rate
+        self.size = size
+        self.sounds = []
+        self._next = 0
+
+    def acquire(self, samples):
+        if len(self.sounds) < self.size:
+            sound = self.sound_class(samples, sampleRate=self.sample_rate)
+            self.sounds.append(sound)
+        else:
+            sound = self.sounds[self._next]
+            sound.setSound(samples)
+        self._next = (self._next + 1) % self.size
+        return sound
+
+# Fixed text screens built once and redrawn on demand
+class ScreenCache:
+    """
+    Each screen is a TextStim created the first time its key is used; later calls
+    with the same key draw the existing stimulus, so its glyphs are not laid out
+    again. `prebuild` creates screens ahead of time, e.g. before the trial loop.
+    """
+
+    def __init__(self, win, text_stim_class, **defaults):
+        self.win = win
+        self.text_stim_class = text_stim_class
+        self.defaults = defaults
+        self.screens = {}
+
+    def get(self, key, text, **kwargs):
+        screen = self.screens.get(key)
+        if screen is None:
+            screen = self.text_stim_class(self.win, text=text, **dict(self.defaults, **kwargs))
+            self.screens[key] = screen
+        return screen
+
+    def prebuild(self, screens, **kwargs):
+        for key, text in screens.items():
+            self.get(key, text, **kwargs)
+
+    # Draw a cached screen and flip the window
+    def show(self, key, text, **kwargs):
+        self.get(key, text, **kwargs).draw()
+        self.win.flip()
@@ -0,0 +1,87 @@
+import time
+import numpy as np
+from results import ResultWriter
+
+# Trial phases in the order they are marked in run_trial / run_adaptive_trial
+PHASES = ['synthesis', 'fixation_flip', 'sound_creation', 'fixation_wait', 'play', 'playback_wait', 'response_flip']
+
+# Records high-resolution timestamps at the end of each phase of one trial
+class TrialTimer:
+    __slots__ = ('kind', 'trial_num', 'marks', 'session_clock', 'session_marks')
+
+    def __init__(self, kind, trial_num, session_clock=None):
+        self.kind = kind
+        self.trial_num = trial_num
+        self.session_clock = session_clock
+        self.marks = [time.perf_counter()]
+        self.session_marks = [session_clock()] if session_clock is not None else None
+
+    def mark(self):
+        self.marks.append(time.perf_counter())
+        if self.session_clock is not None:
+            self.session_marks.append(self.session_clock())
+
+    # Seconds spent in each phase, keyed by phase name; session=True reads the session clock marks
+    def durations(self, session=False):
+        return dict(zip(PHASES, np.diff(self.session_marks if session else self.marks)))
+
+# Stand-in used when instrumentation is off so the trial code needs no branches
+class NullTimer:
+    __slots__ = ()
+
+    def mark(self):
+        pass
+
+# Collects per-trial timing rows and summarises latency and onset jitter
+class TimingLog:
+    """
+    Each finished trial produces one row with the phase durations in milliseconds,
+    the onset error (fixation-to-play time minus the nominal fixation time) and the
+    overshoot of the playback wait beyond the sound's duration. Rows are also written
+    to `filename` when one is given. Phases are always timed with perf_counter; pass
+    `session_clock` when waits run on another clock (the headless backend's virtual
+    clock) so the onset error and overshoot are measured on the clock that waited.
+    """
+
+    COLUMNS = ['kind', 'trial_num'] + [f"{phase}_ms" for phase in PHASES] + ['onset_error_ms', 'wait_overshoot_ms']
+
+    def __init__(self, fixation_time, filename=None, enabled=True, session_clock=None):
+        self.fixation_time = fixation_time
+        self.session_clock = session_clock
+        self.enabled = enabled
+        self.rows = []
+        self._writer = ResultWriter(filename, header=self.COLUMNS) if enabled and filename else None
+
+    def start(self, kind, trial_num):
+        return TrialTimer(kind, trial_num, self.session_clock) if self.enabled else NullTimer()
+
+    def finish(self, timer, sound_duration):
+        if not self.enabled:
+            return None
+        durations = timer.durations()
+        waits = timer.durations(session=True) if self.session_clock is not None else durations
+        fixation_to_play = waits['sound_creation'] + waits['fixation_wait'] + waits['play']
+        row = [timer.kind, timer.trial_num] + [round(durations[phase] * 1000, 3) for phase in PHASES]
+        row.append(round((fixation_to_play - self.fixation_time) * 1000, 3))
+        row.append(round((waits['playback_wait'] - sound_duration) * 1000, 3))
+        self.rows.append(row)
+        if self._writer is not None:
+            self._writer.write(row)
+        return row
+
+    # Percentiles of every timing column plus the onset jitter (SD of the onset error)
+    def summary(self, percentiles=(50, 95, 99)):
+        if not self.rows:
+            return "No trials timed."
+        values = np.array([row[2:] for row in self.rows], dtype=np.float64)
+        lines = [f"Timing over {len(values)} trials (ms): " + ", ".join(f"p{p}" for p in percentiles) + ", max"]
+        for name, column in zip(self.COLUMNS[2:], values.T):
+            stats = ", ".join(f"{value:.3f}" for value in np.percentile(column, percentiles))
+            lines.append(f"  {name}: {stats}, {column.max():.3f}")
+        onset_errors = values[:, self.COLUMNS.index('onset_error_ms') - 2]
+        lines.append(f"  onset jitter (SD): {onset_errors.std():.3f} ms")
+        return "\n".join(lines)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
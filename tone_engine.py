@@ -0,0 +1,98 @@
+import numpy as np
+
+# Constants
+RAMP_DURATION = 0.02  # seconds for the linear attack and release ramps
+
+# Rendered unit-amplitude tones keyed by (frequency, duration, sample_rate, ramp, dtype)
+_templates = {}
+
+# Render a unit-amplitude tone with linear attack/release ramps
+def _render_template(frequency, duration, sample_rate, ramp):
+    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+    tone = np.sin(2 * np.pi * frequency * t)
+
+    # Apply envelope
+    attack_duration = int(sample_rate * ramp)
+    release_duration = int(sample_rate * ramp)
+    envelope = np.ones_like(tone)
+    envelope[:attack_duration] = np.linspace(0, 1, attack_duration)
+    envelope[-release_duration:] = np.linspace(1, 0, release_duration)
+
+    tone *= envelope
+    return tone
+
+# Return the cached unit-amplitude template, rendering it on first use
+def get_template(frequency, duration, sample_rate, ramp=RAMP_DURATION, dtype=np.float64):
+    """
+    The returned array is shared and read-only; scale it with render_tone. The tone is
+    always computed in float64 and only stored in `dtype`.
+    """
+    key = (float(frequency), float(duration), int(sample_rate), float(ramp), np.dtype(dtype).str)
+    template = _templates.get(key)
+    if template is None:
+        template = _render_template(frequency, duration, sample_rate, ramp).astype(dtype, copy=False)
+        template.setflags(write=False)
+        _templates[key] = template
+    return template
+
+# Scale a cached template by amplitude, optionally writing into an existing buffer
+def render_tone(frequency, duration, sample_rate, amplitude, ramp=RAMP_DURATION, out=None, dtype=np.float64):
+    """
+    With amplitude 1 and no output buffer the shared template itself is returned.
+    Passing `out` (same length as the template) scales in place with no allocation.
+    The tone has the template's `dtype`.
+    """
+    template = get_template(frequency, duration, sample_rate, ramp, dtype)
+    if out is not None:
+        return np.multiply(template, amplitude, out=out, casting='unsafe')
+    if amplitude == 1:
+        return template
+    return template * template.dtype.type(amplitude)
+
+# Drop all cached templates (e.g. after changing the sample rate)
+def clear_templates():
+    _templates.clear()
+
+# Compute the onset sample of each tone and the total sequence length
+def sequence_onsets(tone_lengths, intervals, sample_rate):
+    """
+    Each tone is followed by a silence of its interval. Onsets are rounded from the
+    cumulative time rather than per interval, so they never drift from the logged intervals.
+    """
+    tone_lengths = np.asarray(tone_lengths, dtype=np.int64)
+    silence_ends = np.rint(np.cumsum(intervals, dtype=np.float64) * sample_rate).astype(np.int64)
+    tone_ends = np.cumsum(tone_lengths)
+    onsets = np.empty(len(tone_lengths), dtype=np.int64)
+    onsets[0] = 0
+    onsets[1:] = tone_ends[:-1] + silence_ends[:-1]
+    total_length = int(tone_ends[-1] + silence_ends[-1])
+    return onsets, total_length
+
+# Write a list of (tone, interval) pairs into one preallocated buffer
+def assemble_sequence(sequence, sample_rate, dtype=np.float32, out=None):
+    """
+    Pass `out` (at least the total length) to reuse a buffer; only the used prefix is returned.
+    """
+    tones = [tone for tone, _ in sequence]
+    intervals = [interval for _, interval in sequence]
+    onsets, total_length = sequence_onsets([len(tone) for tone in tones], intervals, sample_rate)
+    if out is None:
+        out = np.zeros(total_length, dtype=dtype)
+    else:
+        out = out[:total_length]
+        out.fill(0)
+    for tone, onset in zip(tones, onsets):
+        out[onset:onset + len(tone)] = tone
+    return out
+
+# Onsets and total lengths for many sequences of equal-length tones at once
+def batch_onsets(intervals, tone_length, sample_rate):
+    """
+    `intervals` is a (sequences x tones) matrix; rounding matches sequence_onsets.
+    """
+    intervals = np.asarray(intervals, dtype=np.float64)
+    silence_ends = np.rint(np.cumsum(intervals, axis=1) * sample_rate).astype(np.int64)
+    onsets = np.broadcast_to(np.arange(intervals.shape[1], dtype=np.int64) * tone_length, intervals.shape).copy()
+    onsets[:, 1:] += silence_ends[:, :-1]
+    lengths = intervals.shape[1] * tone_length + silence_ends[:, -1]
+    return onsets, lengths
@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import os
+import zipfile
+import numpy as np
+from tone_engine import batch_onsets
+
+# Marker for "no louder tone" in the integer high_intensity_index column
+NO_TARGET = -1
+
+# Like np.savez, but with fixed zip timestamps so identical arrays give identical files
+def save_npz(path, **arrays):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, value in arrays.items():
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.asanyarray(value), allow_pickle=False)
+            archive.writestr(zipfile.ZipInfo(f"{name}.npy", date_time=(1980, 1, 1, 0, 0, 0)), buffer.getvalue())
+
+# Path of the columnar trial list stored next to a CSV trial list
+def columnar_path(trial_list_filename):
+    return os.path.splitext(trial_list_filename)[0] + ".npz"
+
+# Write trial metadata as typed columns with a fixed-width interval matrix
+def write_trial_list(trial_list_filename, trials):
+    """
+    `trials` are the per-trial dicts built by the generators. A percentage_increase
+    column is written only when the trials carry one.
+    """
+    index = [trial['high_intensity_index'] for trial in trials]
+    columns = {
+        'trial_num': np.array([trial['trial_num'] for trial in trials], dtype=np.int32),
+        'periodic': np.array([trial['periodic'] for trial in trials], dtype=bool),
+        'chosen_IOI': np.array([np.nan if trial['chosen_IOI'] is None else trial['chosen_IOI'] for trial in trials], dtype=np.float64),
+        'has_high_intensity': np.array([trial['has_high_intensity'] for trial in trials], dtype=bool),
+        'high_intensity_index': np.array([NO_TARGET if i is None else i for i in index], dtype=np.int16),
+        'intervals': np.array([trial['intervals'] for trial in trials], dtype=np.float64),
+    }
+    if trials and 'percentage_increase' in trials[0]:
+        columns['percentage_increase'] = np.array([np.nan if trial['percentage_increase'] is None else trial['percentage_increase'] for trial in trials], dtype=np.float64)
+    save_npz(columnar_path(trial_list_filename), **columns)
+
+# Parse a CSV trial list once into the same columns as the .npz format
+def _read_csv_columns(trial_list_filename):
+    with open(trial_list_filename, newline='') as file:
+        rows = list(csv.DictReader(file))
+
+    def optional_float(value):
+        return float(value) if value not in ('', 'None') else np.nan
+
+    columns = {
+        'trial_num': np.array([int(row['trial_num']) for row in rows], dtype=np.int32),
+        'periodic': np.array([row['periodic'] == 'True' for row in rows], dtype=bool),
+        'chosen_IOI': np.array([optional_float(row['chosen_IOI']) for row in rows], dtype=np.float64),
+        'has_high_intensity': np.array([row['has_high_intensity'] == 'True' for row in rows], dtype=bool),
+        'high_intensity_index': np.array([int(float(row['high_intensity_index'])) if row['high_intensity_index'] not in ('', 'None') else NO_TARGET for row in rows], dtype=np.int16),
+        'intervals': np.array([json.loads(row['intervals']) for row in rows], dtype=np.float64),
+    }
+    if rows and 'percentage_increase' in rows[0]:
+        columns['percentage_increase'] = np.array([optional_float(row['percentage_increase']) for row in rows], dtype=np.float64)
+    return columns
+
+# Load a trial list as a dict of NumPy columns
+def load_trial_list(trial_list_filename):
+    """
+    Reads the .npz written by the generators when it exists and falls back to
+    parsing the CSV (e.g. the existing trialList/JUDIT_*.csv files) otherwise.
+    `intervals` is a (trials x SEQ_LEN) float matrix and `high_intensity_index`
+    uses NO_TARGET for trials without a louder tone.
+    """
+    npz_path = columnar_path(trial_list_filename)
+    if os.path.exists(npz_path):
+        with np.load(npz_path) as data:
+            return {name: data[name] for name in data.files}
+    return _read_csv_columns(trial_list_filename)
+
+# Convert loaded columns to a DataFrame with the same columns as the CSV files
+def to_dataframe(columns):
+    """
+    Intervals stay as per-row float arrays and missing target indices become NaN.
+    """
+    import pandas as pd
+
+    frame = {name: values for name, values in columns.items() if name != 'intervals'}
+    frame['high_intensity_index'] = np.where(columns['high_intensity_index'] == NO_TARGET, np.nan, columns['high_intensity_index'])
+    frame['intervals'] = list(columns['intervals'])
+    return pd.DataFrame(frame)
+
+# One compiled trial of a trial list
+class Trial:
+    """
+    Immutable record with typed fields. `high_intensity_index` and `percentage_increase`
+    are None when absent, `onsets` holds the onset sample of every tone and `length`
+    the samples of the whole sequence, including the silence after its last tone.
+    """
+
+    __slots__ = ('trial_num', 'periodic', 'chosen_IOI', 'has_high_intensity', 'high_intensity_index',
+                 'percentage_increase', 'intervals', 'onsets', 'length')
+
+    def __init__(self, trial_num, periodic, chosen_IOI, has_high_intensity, high_intensity_index,
+                 percentage_increase, intervals, onsets, length):
+        for name, value in zip(self.__slots__, (trial_num, periodic, chosen_IOI, has_high_intensity, high_intensity_index,
+                                                percentage_increase, intervals, onsets, length)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Trial is immutable; cannot set {name}")
+
+    def __repr__(self):
+        return (f"Trial(trial_num={self.trial_num}, periodic={self.periodic}, chosen_IOI={self.chosen_IOI}, "
+                f"high_intensity_index={self.high_intensity_index})")
+
+# Validate loaded columns and compile them into a list of Trial records
+def compile_trial_plan(columns, tone_length, sample_rate, seq_len=14):
+    """
+    Onsets are computed for the whole list at once with tone_engine.batch_onsets.
+    """
+    intervals = np.ascontiguousarray(columns['intervals'], dtype=np.float64)
+    if intervals.ndim != 2 or intervals.shape[1] != seq_len:
+        raise ValueError(f"Expected a (trials x {seq_len}) interval matrix, got shape {intervals.shape}")
+    if np.any(intervals < 0) or not np.all(np.isfinite(intervals)):
+        raise ValueError("Intervals must be finite and non-negative")
+    index = columns['high_intensity_index']
+    # The louder tone has to be one of the seq_len tones that are played
+    if np.any((index != NO_TARGET) & ((index < 0) | (index >= seq_len))):
+        raise ValueError(f"high_intensity_index must be between 0 and {seq_len - 1}")
+    if np.any(columns['has_high_intensity'] != (index != NO_TARGET)):
+        raise ValueError("has_high_intensity does not match high_intensity_index")
+
+    onsets, lengths = batch_onsets(intervals, tone_length, sample_rate)
+    intervals.setflags(write=False)
+    onsets.setflags(write=False)
+
+    percentage_increase = columns.get('percentage_increase')
+    plan = []
+    for i in range(len(intervals)):
+        chosen_IOI = float(columns['chosen_IOI'][i])
+        plan.append(Trial(
+            trial_num=int(columns['trial_num'][i]),
+            periodic=bool(columns['periodic'][i]),
+            chosen_IOI=None if np.isnan(chosen_IOI) else chosen_IOI,
+            has_high_intensity=bool(columns['has_high_intensity'][i]),
+            high_intensity_index=None if index[i] == NO_TARGET else int(index[i]),
+            percentage_increase=None if percentage_increase is None or np.isnan(percentage_increase[i]) else float(percentage_increase[i]),
+            intervals=intervals[i],
+            onsets=onsets[i],
+            length=int(lengths[i]),
+        ))
+    return plan
+
+# Load a trial list straight into a validated trial plan
+def load_trial_plan(trial_list_filename, tone_length, sample_rate, seq_len=14):
+    return compile_trial_plan(load_trial_list(trial_list_filename), tone_length, sample_rate, seq_len)
@@ -0,0 +1,193 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+import numpy as np
+from tone_engine import get_template, batch_onsets
+from trial_lists import NO_TARGET, load_trial_list
+from stimulus_bank import load_bank
+from batch_render import trial_gains
+from generation import run_tasks
+from manifest import MANIFEST_PATH, load_manifest
+
+# Constants
+BASE_FREQ = 523.25  # Hz; defaults for lists whose bank and manifest entry do not record them
+DURATION = 0.08  # seconds
+SEQ_LEN = 14
+INTERVAL_BOUNDS = (0.1, 0.375)  # seconds, range of aperiodic intervals
+ONSET_TOLERANCE = 0.003  # seconds a detected onset may trail the logged one (the 20 ms attack ramp starts at zero)
+LEVEL_TOLERANCE = 0.01  # relative tolerance on tone peak levels
+DETECTION_THRESHOLD = 0.05  # fraction of the normal tone level that counts as sound
+CHUNK_SIZE = 16  # trials checked at once
+REPORT_COLUMNS = ['file', 'trial_num', 'passed', 'failures']
+
+# Metadata checks on the columns of a trial list; each maps to a per-trial failure mask
+def check_metadata(columns, seq_len=SEQ_LEN, interval_bounds=INTERVAL_BOUNDS):
+    intervals = columns['intervals']
+    index = columns['high_intensity_index']
+    periodic = columns['periodic']
+    has_target = index != NO_TARGET
+    failures = {
+        'interval_shape': np.full(len(index), intervals.ndim != 2 or intervals.shape[1] != seq_len),
+        'target_flag': columns['has_high_intensity'] != has_target,
+        # The louder tone has to be one of the tones that are actually played
+        'target_out_of_range': has_target & ((index < 0) | (index >= seq_len)),
+    }
+    if failures['interval_shape'].any():
+        return failures
+    low, high = interval_bounds
+    # Intervals are logged rounded to milliseconds, so compare with a tolerance below that
+    out_of_bounds = (intervals < low - 1e-9) | (intervals > high + 1e-9) | ~np.isfinite(intervals)
+    failures['aperiodic_bounds'] = ~periodic & out_of_bounds.any(axis=1)
+    chosen_IOI = columns['chosen_IOI'][:, None]
+    failures['periodic_ioi'] = periodic & ~np.isclose(intervals, chosen_IOI).all(axis=1)
+    if 'percentage_increase' in columns:
+        increase = columns['percentage_increase']
+        failures['target_level'] = has_target & ~(np.isfinite(increase) & (increase > 0))
+    return failures
+
+# Peak absolute level of consecutive segments of every row of padded (trials x samples) audio
+def segment_peaks(audio, boundaries):
+    """
+    `boundaries` is (trials x segments) sample positions; segment j of a row runs from
+    boundaries[:, j] to boundaries[:, j + 1], and the last one to the end of the row.
+    All rows are reduced in one np.maximum.reduceat pass, so every sample is read
+    once. Empty segments have peak 0.
+    """
+    rows, width = audio.shape
+    starts = np.clip(boundaries, 0, width) + (np.arange(rows) * width)[:, None]
+    ends = np.concatenate([starts[:, 1:], (np.arange(1, rows + 1) * width)[:, None]], axis=1)
+    flat = np.abs(audio).ravel()
+    peaks = np.maximum.reduceat(flat, np.minimum(starts, flat.size - 1).ravel()).reshape(starts.shape)
+    return np.where(ends > starts, peaks, 0)
+
+# Audio checks on a chunk of rendered trials against their expected onsets and tone levels
+def check_audio(audio, lengths, expected_lengths, onsets, gains, tone_length, sample_rate,
+                onset_tolerance=ONSET_TOLERANCE, level_tolerance=LEVEL_TOLERANCE):
+    """
+    `audio` is padded (trials x samples), `onsets` and `gains` are (trials x tones).
+    Each row is split at the logged onsets into silent gaps, the first
+    `onset_tolerance` of every tone and the rest of the tone, and only the peak of
+    each segment is kept. A gap (or the tail) with sound means a stray or early
+    tone; a tone whose first segment stays quiet starts late or not at all.
+    """
+    rows, tones = onsets.shape
+    failures = {'length': lengths != expected_lengths}
+
+    tone_end = onsets + tone_length
+    attack_end = np.minimum(onsets + int(onset_tolerance * sample_rate) + 1, tone_end)
+    gap_start = np.concatenate([np.zeros((rows, 1), dtype=onsets.dtype), tone_end], axis=1)
+    boundaries = np.stack([gap_start[:, :-1], onsets, attack_end], axis=2).reshape(rows, -1)
+    peaks = segment_peaks(audio, np.concatenate([boundaries, tone_end[:, -1:]], axis=1))
+    gap_peaks = np.concatenate([peaks[:, 0:-1:3], peaks[:, -1:]], axis=1)
+    attack_peaks = peaks[:, 1:-1:3]
+    tone_peaks = np.maximum(attack_peaks, peaks[:, 2:-1:3])
+
+    failures['tone_level'] = ~np.isclose(tone_peaks, gains, rtol=level_tolerance, atol=0).all(axis=1)
+    # The loudest tone has to be the target, or no tone may stand out when there is none
+    louder = gains > gains.min(axis=1, keepdims=True) * (1 + level_tolerance)
+    stands_out = tone_peaks > tone_peaks.min(axis=1, keepdims=True) * (1 + level_tolerance)
+    failures['loudest_tone'] = (louder != stands_out).any(axis=1)
+
+    threshold = DETECTION_THRESHOLD * gains.min()
+    failures['stray_sound'] = (gap_peaks > threshold).any(axis=1)
+    failures['onset_timing'] = (attack_peaks <= threshold).any(axis=1)
+    return failures
+
+# Tone and sequence parameters a trial list was generated with, from the manifest next to it
+def generation_params(trial_list_filename):
+    manifest_path = os.path.join(os.path.dirname(trial_list_filename), os.path.basename(MANIFEST_PATH))
+    recorded = load_manifest(manifest_path).get(os.path.basename(trial_list_filename), {}).get('params', {})
+    return {name: recorded.get(name, default) for name, default in
+            (('BASE_FREQ', BASE_FREQ), ('DURATION', DURATION), ('SEQ_LEN', SEQ_LEN))}
+
+# Padded (trials x samples) copy of a range of trials from a stimulus bank
+def _bank_rows(bank, start, stop):
+    lengths = bank.lengths[start:stop]
+    audio = np.zeros((len(lengths), int(lengths.max())), dtype=np.float32)
+    for row, trial_num in enumerate(range(start, stop)):
+        audio[row, :lengths[row]] = bank.format.decode(bank[trial_num])
+    return audio
+
+# Validate one trial list and, when it has one, its stimulus bank
+def validate_trial_list(trial_list_filename, check_bank=True, chunk_size=CHUNK_SIZE):
+    """
+    The tone frequency and duration come from the bank index, and the sequence length
+    and (for older banks) the tone from the list's manifest entry, so lists are checked
+    against what they were generated with rather than against this module's defaults.
+    Returns a list of (trial_num, failure names) with an empty list for passing trials.
+    """
+    columns = load_trial_list(trial_list_filename)
+    params = generation_params(trial_list_filename)
+    seq_len = params['SEQ_LEN']
+    failures = check_metadata(columns, seq_len)
+
+    bank = load_bank(trial_list_filename) if check_bank else None
+    if bank is not None and not failures['interval_shape'].any():
+        frequency = params['BASE_FREQ'] if bank.frequency is None else bank.frequency
+        duration = params['DURATION'] if bank.duration is None else bank.duration
+        template = get_template(frequency, duration, bank.sample_rate)
+        expected_onsets, expected_lengths = batch_onsets(columns['intervals'], len(template), bank.sample_rate)
+        # JUDIT_gen_trials.py banks hold the louder tone; gen.py banks hold the sequence at the normal level
+        target_amplitude = columns.get('percentage_increase', np.full(len(bank), bank.amplitude))
+        gains = trial_gains(columns['high_intensity_index'], bank.amplitude,
+                            np.nan_to_num(target_amplitude, nan=bank.amplitude), seq_len)
+
+        trials = len(columns['intervals'])
+        failures['bank_size'] = np.full(trials, len(bank) != trials)
+        if len(bank) == trials:
+            failures['bank_onsets'] = (bank.onsets != expected_onsets).any(axis=1)
+            audio_failures = {}
+            for start in range(0, trials, chunk_size):
+                stop = min(start + chunk_size, trials)
+                chunk = check_audio(_bank_rows(bank, start, stop), bank.lengths[start:stop], expected_lengths[start:stop],
+                                    expected_onsets[start:stop], gains[start:stop], len(template), bank.sample_rate)
+                for name, mask in chunk.items():
+                    audio_failures.setdefault(name, []).append(mask)
+            failures.update({name: np.concatenate(masks) for name, masks in audio_failures.items()})
+
+    names = list(failures)
+    failed = np.array([np.broadcast_to(failures[name], columns['trial_num'].shape) for name in names])
+    return [(int(trial_num), [names[j] for j in np.nonzero(failed[:, i])[0]])
+            for i, trial_num in enumerate(columns['trial_num'])]
+
+# Validate many trial lists, across a process pool when workers > 1
+def validate_all(filenames, check_bank=True, workers=1):
+    results = run_tasks(validate_trial_list, [(filename, check_bank) for filename in filenames], workers)
+    return dict(zip(filenames, results))
+
+# Write the per-trial pass/fail report
+def write_report(results, report_filename):
+    with open(report_filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(REPORT_COLUMNS)
+        for filename, trials in results.items():
+            for trial_num, failures in trials:
+                writer.writerow([os.path.basename(filename), trial_num, not failures, ';'.join(failures)])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check generated trial lists and stimulus banks against their metadata.")
+    parser.add_argument('files', nargs='*', help="trial list CSVs (default: every CSV in trialList/)")
+    parser.add_argument('--report', default="validation_report.csv", help="per-trial pass/fail CSV")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes")
+    parser.add_argument('--no-audio', action='store_true', help="only check metadata, not the stimulus banks")
+    args = parser.parse_args()
+
+    filenames = args.files or sorted(glob.glob("trialList/*.csv"))
+    filenames = [filename for filename in filenames if os.path.abspath(filename) != os.path.abspath(args.report)]
+    results = validate_all(filenames, not args.no_audio, args.workers)
+    write_report(results, args.report)
+
+    failed_trials = 0
+    for filename, trials in results.items():
+        failed = [failures for _, failures in trials if failures]
+        failed_trials += len(failed)
+        counts = {}
+        for failures in failed:
+            for name in failures:
+                counts[name] = counts.get(name, 0) + 1
+        details = ", ".join(f"{name}: {count}" for name, count in sorted(counts.items()))
+        print(f"{filename}: {len(trials) - len(failed)}/{len(trials)} trials passed" + (f" ({details})" if details else ""))
+    print(f"Report written to {args.report}")
+    sys.exit(1 if failed_trials else 0)